@@ -0,0 +1,173 @@
+"""
+Vectorized engine that plays many games of the same dimensions at once.
+
+Requires NumPy.  The games are stored as stacked arrays (struct of arrays):
+one row of 'board' and 'mask' per game, plus state and hidden safe cell
+vectors.  Every step digs one cell in every game, following the rules of
+minesweeper.dig_nd.
+"""
+
+from array import array
+
+import numpy as np
+
+from minesweeper import (BOMB, board_typecode, box_sum_numpy, flatten_game,
+                         get_strides, is_flat)
+
+
+ONGOING, DEFEAT, VICTORY = 0, 1, 2
+STATES = ('ongoing', 'defeat', 'victory')
+
+
+class GameBatch:
+    """
+    K games of the same dimensions, stored as NumPy arrays:
+
+       board (K, V): neighbor counts in row-major order, BOMB for bombs
+       mask (K, V): which cells are revealed
+       hidden_safe (K,): safe cells that are not revealed yet
+       states (K,): ONGOING, DEFEAT or VICTORY
+
+    where V is the number of cells of a board.
+    """
+
+    def __init__(self, dimensions, bombs):
+        """
+        Start K new games.
+
+        Parameters:
+           dimensions (tuple): dimensions shared by all boards
+           bombs (list): one list of bomb coordinates per game
+        """
+
+        self.dimensions = tuple(dimensions)
+        self.strides = np.array(get_strides(self.dimensions))
+        self.size = len(bombs)
+
+        shape = (self.size,) + self.dimensions
+        counts = np.zeros(shape, dtype=board_typecode(self.dimensions))
+        games = [k for k, b in enumerate(bombs) for _ in b]
+        if games:
+            cells = np.array([c for b in bombs for c in b]).reshape(len(games), -1)
+            index = (np.array(games),) + tuple(cells.T)
+            np.add.at(counts, index, 1)
+            counts = box_sum_numpy(counts, range(1, len(shape)))
+            counts[index] = BOMB
+
+        self.board = counts.reshape(self.size, -1)
+        self.mask = np.zeros(self.board.shape, dtype=bool)
+        self.hidden_safe = (self.board != BOMB).sum(axis=1)
+        self.states = np.full(self.size, ONGOING, dtype=np.int8)
+
+    @classmethod
+    def from_games(cls, games):
+        """
+        Stacks existing games (nested-list or flat, all of the same
+        dimensions) into a batch.
+
+        Parameters:
+           games (list): game state dictionaries
+
+        Returns: a GameBatch
+        """
+
+        batch = cls(games[0]['dimensions'], [[] for _ in games])
+        for k, game in enumerate(games):
+            flat = game if is_flat(game) else flatten_game(game)
+            batch.board[k] = list(flat['board'])
+            batch.mask[k] = list(flat['mask'])
+            batch.states[k] = STATES.index(flat['state'])
+
+        batch.hidden_safe = ((batch.board != BOMB) & ~batch.mask).sum(axis=1)
+        return batch
+
+    def game(self, k):
+        """
+        Gets game k as a flat game state dictionary (a copy).
+
+        Parameters:
+           k (int): index of the game
+
+        Returns: a flat game state dictionary
+        """
+
+        typecode = board_typecode(self.dimensions)
+        return {
+            'dimensions': self.dimensions,
+            'strides': tuple(int(s) for s in self.strides),
+            'board': array(typecode, self.board[k].tobytes()),
+            'mask': bytearray(self.mask[k].tobytes()),
+            'hidden_safe': int(self.hidden_safe[k]),
+            'state': STATES[self.states[k]]}
+
+    def step(self, coordinates):
+        """
+        Digs one cell in every game.  Games that are over (or whose cell is
+        already revealed) are left unchanged.  Zero regions of all games are
+        flood filled together, one 3^N dilation per step of the fill.
+
+        Parameters:
+           coordinates (array): (K, N) coordinates, one cell per game
+
+        Returns: a dictionary with K-vectors 'revealed' (number of squares
+            revealed), 'rewards' (squares revealed, or -1 for the move that
+            hit a bomb) and 'done' (whether the game is over)
+
+        >>> from minesweeper import dig_nd, new_game_flat
+        >>> bombs = [[(0, 0), (1, 0), (1, 1)], [(2, 3)], []]
+        >>> batch = GameBatch((3, 4), bombs)
+        >>> games = [new_game_flat((3, 4), b) for b in bombs]
+        >>> for cells in [(0, 3), (0, 0), (1, 1)], [(1, 0), (2, 3), (0, 0)]:
+        ...     result = batch.step(cells)
+        ...     digs = [dig_nd(g, c) for g, c in zip(games, cells)]
+        ...     print(result['revealed'].tolist(), digs, result['rewards'].tolist())
+        [6, 11, 12] [6, 11, 12] [6.0, 11.0, 12.0]
+        [1, 0, 0] [1, 0, 0] [-1.0, 0.0, 0.0]
+        >>> [batch.game(k) == g for k, g in enumerate(games)]
+        [True, True, True]
+        >>> [g['state'] for g in games], batch.step([(0, 1)] * 3)['done'].tolist()
+        (['defeat', 'victory', 'victory'], [True, True, True])
+        """
+
+        offsets = np.asarray(coordinates).reshape(self.size, -1) @ self.strides
+        rows = np.arange(self.size)
+        revealed = np.zeros(self.size, dtype=np.int64)
+
+        valid = (self.states == ONGOING) & ~self.mask[rows, offsets]
+        games = rows[valid]
+        offsets = offsets[valid]
+
+        self.mask[games, offsets] = True
+        revealed[games] = 1
+        values = self.board[games, offsets]
+
+        # Flood fill from every dig that hit a 0
+        active = games[values == 0]
+        frontier = np.zeros((len(active), self.board.shape[1]), dtype=bool)
+        frontier[np.arange(len(active)), offsets[values == 0]] = True
+
+        while len(active):
+            grown = box_sum_numpy(frontier.reshape((-1,) + self.dimensions),
+                                  range(1, len(self.dimensions) + 1))
+            new = grown.reshape(frontier.shape) & ~self.mask[active]
+            self.mask[active] |= new
+            revealed[active] += new.sum(axis=1)
+
+            frontier = new & (self.board[active] == 0)
+            keep = frontier.any(axis=1)
+            active = active[keep]
+            frontier = frontier[keep]
+
+        lost = games[values == BOMB]
+        safe = games[values != BOMB]
+        self.states[lost] = DEFEAT
+        self.hidden_safe[safe] -= revealed[safe]
+        self.states[safe[self.hidden_safe[safe] == 0]] = VICTORY
+
+        rewards = revealed.astype(float)
+        rewards[lost] = -1
+
+        return {
+            'revealed': revealed,
+            'rewards': rewards,
+            'done': self.states != ONGOING}
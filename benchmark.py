@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the core game functions over a matrix of board shapes and bomb
+densities, and checks the results against a stored baseline.
+
+    python benchmark.py --output results.json
+    python benchmark.py --baseline results.json --threshold 0.25
+
+Each case is timed (best of --repeat runs) and its peak memory measured
+with tracemalloc in a separate run.  Fresh game copies for each run are
+made before the timer starts.  With --baseline, the run fails (exit
+status 1) if a case got slower or bigger than the baseline by more than the
+threshold.  Times under --min-seconds are too noisy to compare and are not
+checked.
+
+benchmark_baseline.json holds the results of --quick on the reference
+machine.  Check a change against it with
+
+    python benchmark.py --quick --baseline benchmark_baseline.json
+
+and refresh it (on the same machine, with --output) when a change makes
+cases faster or smaller on purpose.  Times from another machine are not
+comparable: make a baseline there first.  On shared or virtual machines the
+best times of two runs can differ by 2x, so pass a larger --threshold there;
+peak memory does not vary between runs.
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from math import prod
+
+from minesweeper import (BOMB, dig_nd, get_all_cells_tensor, get_strides, is_won,
+                         new_game_flat, new_game_nd, offset_to_cell,
+                         random_bomb_offsets, random_game_flat, render_ascii,
+                         render_nd, unflatten_game)
+
+
+SHAPES = [(100000,), (300, 300), (45, 45, 45), (17, 17, 17, 17),
+          (10, 10, 10, 10, 10), (6, 6, 6, 6, 6, 6)]
+QUICK_SHAPES = [(10000,), (100, 100), (20, 20, 20), (10, 10, 10, 10),
+                (6, 6, 6, 6, 6), (4, 4, 4, 4, 4, 4)]
+DENSITIES = [0.01, 0.15]
+
+
+def center(dimensions):
+    """
+    Gets the middle cell of a board, where the opening digs are made.
+
+    >>> center((5, 4, 1))
+    (2, 2, 0)
+    """
+
+    return tuple(d // 2 for d in dimensions)
+
+
+def bench_new_game(dimensions, density):
+    bombs = random_bomb_offsets(dimensions, round(density * prod(dimensions)), 0)
+    strides = get_strides(dimensions)
+    bombs = [offset_to_cell(strides, o) for o in bombs]
+    return lambda: new_game_nd(dimensions, bombs)
+
+
+def fresh_copy(game):
+    # A flat game with its own mask, to dig without changing game
+    return lambda: dict(game, mask=bytearray(game['mask']))
+
+
+def nested_copy(game):
+    # new_game_nd with the bombs of a flat game; it keeps its flat copy, as
+    # a game being played does
+    strides = game['strides']
+    bombs = [offset_to_cell(strides, o) for o, v in enumerate(game['board']) if v == BOMB]
+    return lambda: new_game_nd(game['dimensions'], bombs)
+
+
+def opening_dig(copy):
+    def bench(dimensions, density):
+        num_bombs = min(round(density * prod(dimensions)),
+                        prod(dimensions) - 3 ** len(dimensions))
+        game = random_game_flat(dimensions, num_bombs, 0, center(dimensions))
+        return copy(game), lambda g: dig_nd(g, center(dimensions))
+    return bench
+
+
+def flood_dig(copy):
+    def bench(dimensions, density):
+        # Worst case: one bomb in a corner, the whole board is one zero region
+        game = new_game_flat(dimensions, [(0,) * len(dimensions)])
+        far = tuple(d - 1 for d in dimensions)
+        return copy(game), lambda g: dig_nd(g, far)
+    return bench
+
+
+def single_digs(copy):
+    def bench(dimensions, density):
+        game = random_game_flat(dimensions, round(density * prod(dimensions)), 0)
+        strides = get_strides(dimensions)
+        numbered = [offset_to_cell(strides, o)
+                    for o, v in enumerate(game['board']) if v > 0][:1000]
+
+        def run(g):
+            for cell in numbered:
+                dig_nd(g, cell)
+        return copy(game), run
+    return bench
+
+
+def bench_is_won(dimensions, density):
+    game = random_game_flat(dimensions, round(density * prod(dimensions)), 0)
+    game['mask'] = bytearray(v != BOMB for v in game['board'])
+    game = unflatten_game(game)
+    cell_locs = get_all_cells_tensor(dimensions, game['board'])
+    return lambda: is_won(game['board'], game['mask'], cell_locs)
+
+
+def bench_render_nd(dimensions, density):
+    game = random_game_flat(dimensions, round(density * prod(dimensions)), 0)
+    game['mask'] = bytearray(o % 2 for o in range(len(game['mask'])))
+    game = unflatten_game(game)
+    return lambda: render_nd(game)
+
+
+def bench_render_ascii(dimensions, density):
+    if len(dimensions) != 2:
+        return None
+    game = random_game_flat(dimensions, round(density * prod(dimensions)), 0)
+    game['mask'] = bytearray(o % 2 for o in range(len(game['mask'])))
+    game = unflatten_game(game)
+    return lambda: render_ascii(game)
+
+
+CASES = {
+    'new_game_nd': bench_new_game,
+    'dig_nd/opening': opening_dig(fresh_copy),
+    'dig_nd/flood': flood_dig(fresh_copy),
+    'dig_nd/single': single_digs(fresh_copy),
+    'dig_nd/nested/opening': opening_dig(nested_copy),
+    'dig_nd/nested/flood': flood_dig(nested_copy),
+    'dig_nd/nested/single': single_digs(nested_copy),
+    'is_won': bench_is_won,
+    'render_nd': bench_render_nd,
+    'render_ascii': bench_render_ascii,
+}
+
+
+def measure(run, repeat):
+    """
+    Times a benchmark and measures its peak memory.
+
+    Parameters:
+       run: function to measure, or a tuple (prepare, function): prepare()
+            is called untimed before each run, and its result passed to
+            the function
+       repeat (int): number of timed runs
+
+    Returns: a tuple (best time in seconds, peak traced bytes)
+
+    Each run of a (prepare, function) tuple gets a fresh prepare() result,
+    made outside the timer and the memory trace:
+
+    >>> made = []
+    >>> def prepare():
+    ...     made.append(bytearray(10 ** 6))
+    ...     return made[-1]
+    >>> seconds, peak = measure((prepare, lambda buffer: buffer.count(1)), 2)
+    >>> len(made), peak < 10 ** 5
+    (3, True)
+    """
+
+    if isinstance(run, tuple):
+        prepare, run = run
+    else:
+        prepare = None
+
+    def arguments():
+        return () if prepare is None else (prepare(),)
+
+    best = float('inf')
+    for _ in range(repeat):
+        args = arguments()
+        start = time.perf_counter()
+        run(*args)
+        best = min(best, time.perf_counter() - start)
+
+    args = arguments()
+    tracemalloc.start()
+    run(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run_benchmarks(shapes=SHAPES, densities=DENSITIES, cases=CASES, repeat=3,
+                   log=None):
+    """
+    Runs every case for every shape and density.
+
+    Parameters:
+       shapes (list): board dimensions
+       densities (list): fractions of the cells that are bombs
+       cases (dict): case name -> function (dimensions, density) returning
+                     what to measure (see measure), or None to skip
+       repeat (int): number of timed runs per case
+       log: file-like object progress lines are written to
+
+    Returns: a list of result dictionaries
+    """
+
+    results = []
+    for dimensions in shapes:
+        for density in densities:
+            for name, setup in cases.items():
+                run = setup(dimensions, density)
+                if run is None:
+                    continue
+                seconds, peak = measure(run, repeat)
+                results.append({
+                    'case': name,
+                    'dimensions': list(dimensions),
+                    'density': density,
+                    'seconds': seconds,
+                    'peak_bytes': peak})
+                if log is not None:
+                    log.write(f'{name:22} {str(dimensions):28} {density:<5} '
+                              f'{seconds * 1000:10.2f} ms {peak / 1e6:10.2f} MB\n')
+    return results
+
+
+def result_key(result):
+    """
+    Gets the name of the case, shape and density of a result, which
+    identifies it across runs.
+
+    >>> result_key({'case': 'is_won', 'dimensions': [10, 10], 'density': 0.15})
+    'is_won (10, 10) 0.15'
+    """
+
+    return f"{result['case']} {tuple(result['dimensions'])} {result['density']}"
+
+
+def find_regressions(results, baseline, threshold, min_seconds=0.0):
+    """
+    Compares results with a baseline.
+
+    Parameters:
+       results (list): run_benchmarks results
+       baseline (list): run_benchmarks results of a previous run
+       threshold (float): allowed relative increase (0.25 = 25%)
+       min_seconds (float): times are only compared when the new one is at
+                            least this long
+
+    Returns: a list of messages, one per regression
+
+    Cases missing from the baseline are skipped:
+
+    >>> def result(case, seconds, peak_bytes):
+    ...     return {'case': case, 'dimensions': [10], 'density': 0.01,
+    ...             'seconds': seconds, 'peak_bytes': peak_bytes}
+    >>> baseline = [result('dig_nd', 1.0, 1000), result('is_won', 1.0, 1000)]
+    >>> find_regressions([result('dig_nd', 1.2, 2000), result('is_won', 1.3, 900),
+    ...                   result('render_nd', 9.0, 9000)], baseline, 0.25)
+    ['dig_nd (10,) 0.01: peak_bytes 1000 -> 2000', 'is_won (10,) 0.01: seconds 1 -> 1.3']
+    >>> find_regressions([result('is_won', 1.3, 900)], baseline, 0.25, min_seconds=2)
+    []
+    """
+
+    previous = {result_key(r): r for r in baseline}
+    regressions = []
+    for r in results:
+        old = previous.get(result_key(r))
+        if old is None:
+            continue
+        for field in ('seconds', 'peak_bytes'):
+            if field == 'seconds' and r[field] < min_seconds:
+                continue
+            if r[field] > old[field] * (1 + threshold):
+                regressions.append(f'{result_key(r)}: {field} {old[field]:.6g} -> {r[field]:.6g}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='use small boards')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25)
+    parser.add_argument('--min-seconds', type=float, default=0.001)
+    args = parser.parse_args(argv)
+
+    shapes = QUICK_SHAPES if args.quick else SHAPES
+    results = run_benchmarks(shapes, repeat=args.repeat, log=sys.stdout)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = find_regressions(results, json.load(fp), args.threshold,
+                                           args.min_seconds)
+        for message in regressions:
+            print('REGRESSION', message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
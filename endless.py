@@ -0,0 +1,352 @@
+"""
+Endless N-D games on an unbounded board split into fixed-size chunks.
+
+The bombs of a chunk are generated from (seed, chunk index) the first time a
+dig or render touches it, so any chunk can be dropped and rebuilt
+identically.  Only the max_chunks most recently used chunks are kept in
+memory; the masks of evicted chunks are saved, bit-packed, to a store, and
+reloaded on demand.  The store is a temporary dbm file by default (deleted by
+EndlessGame.close), or any mapping with str keys and bytes values: a dbm or
+shelve file to keep the game, or a dict, whose memory then grows with the
+explored area.  Flood fills cut by reveal_limit keep at most max_pending
+cells to expand in memory, and spill the others to the store too, so with a
+file store the memory of a game is bounded.
+
+Neighbor counts and flood fills follow the rules of minesweeper.new_game_nd
+and minesweeper.dig_nd, across chunk boundaries.  There are no borders, so
+there is no victory: a game is 'ongoing' until a bomb is dug.
+"""
+
+import dbm
+import os
+import random
+import shutil
+import tempfile
+from array import array
+from collections import OrderedDict
+from itertools import chain, product
+from math import prod
+
+from minesweeper import (BOMB, board_typecode, get_strides, neighbor_table,
+                         nest_values, render_table)
+from storage import pack_bits, unpack_bits
+
+
+class EndlessGame:
+    """
+    An endless game.  Cells have integer coordinates, which may be negative.
+    """
+
+    def __init__(self, chunk_shape, density, seed=0, max_chunks=64, store=None,
+                 reveal_limit=1000000, max_pending=100000):
+        """
+        Parameters:
+           chunk_shape (tuple): dimensions of a chunk
+           density (float): fraction of the cells of each chunk that are bombs
+           seed: seed of the board
+           max_chunks (int): number of chunks kept in memory
+           store: mapping the masks of evicted chunks (and spilled pending
+                  cells) are saved to; a temporary dbm file by default
+           reveal_limit (int): most cells a single dig reveals; a flood fill
+                               that reaches it stops, and the cells it still
+                               had to expand are kept in 'pending' (see resume)
+           max_pending (int): most cells kept in 'pending'; older ones are
+                              saved to the store in batches of this size
+        """
+
+        self.chunk_shape = tuple(chunk_shape)
+        self.strides = get_strides(self.chunk_shape)
+        self.deltas = neighbor_table(self.chunk_shape)[1]
+        self.volume = prod(self.chunk_shape)
+        self.bombs_per_chunk = round(density * self.volume)
+        self.seed = seed
+        self.max_chunks = max_chunks
+        self.store_path = None
+        if store is None:
+            self.store_path = tempfile.mkdtemp(prefix='endless-')
+            store = dbm.open(os.path.join(self.store_path, 'store'), 'n')
+        self.store = store
+        self.reveal_limit = reveal_limit
+        self.max_pending = max_pending
+
+        self.chunks = OrderedDict()  # chunk index -> {'board': ..., 'mask': ...}
+        self.bomb_sets = OrderedDict()  # chunk index -> bomb offsets in the chunk
+        self.pending = []
+        self.spilled = 0  # batches of pending cells saved to the store
+        self.state = 'ongoing'
+
+    def chunk_bombs(self, index):
+        """
+        Generates (or gets from the cache) the bombs of a chunk.
+
+        Parameters:
+           index (tuple): chunk index
+
+        Returns: a frozenset of offsets in the chunk
+        """
+
+        bombs = self.bomb_sets.get(index)
+        if bombs is None:
+            rng = random.Random(f'{self.seed}:{index}')
+            bombs = frozenset(rng.sample(range(self.volume), self.bombs_per_chunk))
+            self.bomb_sets[index] = bombs
+            if len(self.bomb_sets) > 3 ** len(index) * self.max_chunks:
+                self.bomb_sets.popitem(last=False)
+        else:
+            self.bomb_sets.move_to_end(index)
+        return bombs
+
+    def build_board(self, index):
+        """
+        Computes the neighbor counts of a chunk, from its bombs and the bombs
+        of the chunks around it.
+
+        Parameters:
+           index (tuple): chunk index
+
+        Returns: a flat board array
+        """
+
+        shape = self.chunk_shape
+        board = array(board_typecode(shape), [0]) * self.volume
+
+        for step in product((-1, 0, 1), repeat=len(shape)):
+            other = tuple(i + s for i, s in zip(index, step))
+            for o in self.chunk_bombs(other):
+                # Bomb position relative to the origin of this chunk
+                cell = [c + s * d for c, s, d in
+                        zip(self.local_cell(o), step, shape)]
+                for delta in self.deltas:
+                    n = [c + dc for c, dc in zip(cell, delta)]
+                    if all(0 <= c < d for c, d in zip(n, shape)):
+                        board[sum(c * s for c, s in zip(n, self.strides))] += 1
+
+        for o in self.chunk_bombs(index):
+            board[o] = BOMB
+        return board
+
+    def local_cell(self, offset):
+        """
+        Maps an offset in a chunk to coordinates in the chunk.
+        """
+
+        cell = []
+        for s in self.strides:
+            c, offset = divmod(offset, s)
+            cell.append(c)
+        return cell
+
+    def chunk(self, index):
+        """
+        Gets a chunk, building it (and reloading its mask from the store) if
+        it is not in memory.  The least recently used chunk is evicted when
+        there are more than max_chunks.
+
+        Parameters:
+           index (tuple): chunk index
+
+        Returns: a dictionary with the chunk's 'board' and 'mask'
+        """
+
+        chunk = self.chunks.get(index)
+        if chunk is not None:
+            self.chunks.move_to_end(index)
+            return chunk
+
+        saved = self.store.get(repr(index))
+        mask = bytearray(self.volume) if saved is None else unpack_bits(saved, self.volume)
+        chunk = self.chunks[index] = {'board': self.build_board(index), 'mask': mask}
+
+        if len(self.chunks) > self.max_chunks:
+            self.save_chunk(*self.chunks.popitem(last=False))
+        return chunk
+
+    def save_chunk(self, index, chunk):
+        """
+        Saves the mask of a chunk to the store, if it has revealed cells.
+        """
+
+        if any(chunk['mask']):
+            self.store[repr(index)] = pack_bits(chunk['mask'])
+
+    def flush(self):
+        """
+        Saves the masks of every chunk in memory to the store.
+        """
+
+        for index, chunk in self.chunks.items():
+            self.save_chunk(index, chunk)
+
+    def close(self):
+        """
+        Deletes the temporary store, if the game made one.  A store passed to
+        the game is left open (call flush first to save every chunk to it).
+        """
+
+        if self.store_path is not None:
+            self.store.close()
+            shutil.rmtree(self.store_path, ignore_errors=True)
+            self.store_path = None
+
+    def locate(self, cell):
+        """
+        Finds the chunk of a cell.
+
+        Parameters:
+           cell (tuple): cell coordinates
+
+        Returns: a tuple (chunk, offset of the cell in the chunk)
+        """
+
+        index = []
+        offset = 0
+        for c, d, s in zip(cell, self.chunk_shape, self.strides):
+            i, c = divmod(c, d)
+            index.append(i)
+            offset += c * s
+        return self.chunk(tuple(index)), offset
+
+    def dig(self, cell):
+        """
+        Digs a cell, following the rules of minesweeper.dig_nd.
+
+        Parameters:
+           cell (tuple): cell coordinates
+
+        Returns: the number of cells revealed
+
+        >>> g = EndlessGame((8, 8), 0.15, seed=1, max_chunks=4)
+        >>> g.dig((1000, -1000)) > 0
+        True
+        >>> g.dig((1000, -1000))
+        0
+        >>> g.render((999, -1001), (3, 3), xray=True) == g.render((999, -1001), (3, 3), xray=True)
+        True
+        >>> g.close()
+        """
+
+        if self.state != 'ongoing':
+            return 0
+
+        chunk, offset = self.locate(cell)
+        if chunk['mask'][offset]:
+            return 0
+
+        chunk['mask'][offset] = 1
+        value = chunk['board'][offset]
+        if value == BOMB:
+            self.state = 'defeat'
+            return 1
+
+        return 1 + self.flood([tuple(cell)] if value == 0 else [])
+
+    def resume(self):
+        """
+        Continues a flood fill that stopped at reveal_limit.  'pending' is
+        empty once the fill is complete.
+
+        Returns: the number of cells revealed
+
+        An empty board is one endless zero region, but at most max_pending
+        cells to expand are kept in memory:
+
+        >>> g = EndlessGame((4, 4), 0, reveal_limit=50, max_pending=8)
+        >>> g.dig((0, 0)), len(g.pending), g.spilled
+        (54, 4, 5)
+        >>> [g.resume() for _ in range(3)], len(g.pending) <= 8
+        ([50, 50, 50], True)
+        >>> g.close()
+
+        A fill resumed until 'pending' is empty reveals the same cells as
+        one without a limit:
+
+        >>> g = EndlessGame((8, 8), 0.2, seed=31, reveal_limit=5, max_pending=3)
+        >>> revealed = g.dig((0, 0))
+        >>> while g.pending:
+        ...     revealed += g.resume()
+        >>> full = EndlessGame((8, 8), 0.2, seed=31)
+        >>> revealed, full.dig((0, 0)), g.render((-8, -8), (24, 24)) == full.render((-8, -8), (24, 24))
+        (76, 76, True)
+        >>> g.close()
+        >>> full.close()
+        """
+
+        stack, self.pending = self.pending, []
+        revealed = self.flood(stack)
+        if not self.pending:
+            self.load_pending()
+        return revealed
+
+    def spill_pending(self):
+        """
+        Saves the oldest max_pending cells of 'pending' to the store.
+        """
+
+        batch = self.pending[:self.max_pending]
+        del self.pending[:self.max_pending]
+        values = array('q', chain.from_iterable(batch))
+        self.store[f'pending:{self.spilled}'] = values.tobytes()
+        self.spilled += 1
+
+    def load_pending(self):
+        """
+        Moves the last batch of spilled cells from the store to 'pending'.
+        """
+
+        if not self.spilled:
+            return
+        self.spilled -= 1
+        key = f'pending:{self.spilled}'
+        values = array('q', self.store[key])
+        del self.store[key]
+        n = len(self.chunk_shape)
+        self.pending = [tuple(values[i:i + n]) for i in range(0, len(values), n)]
+
+    def flood(self, stack):
+        """
+        Reveals the neighbors of the 0 cells on the stack, and so on.
+
+        Parameters:
+           stack (list): coordinates of revealed 0 cells to expand
+
+        Returns: the number of cells revealed
+        """
+
+        revealed = 0
+        while stack and revealed < self.reveal_limit:
+            cell = stack.pop()
+            for delta in self.deltas:
+                n = tuple(c + d for c, d in zip(cell, delta))
+                chunk, offset = self.locate(n)
+                if not chunk['mask'][offset]:
+                    chunk['mask'][offset] = 1
+                    revealed += 1
+                    if chunk['board'][offset] == 0:
+                        stack.append(n)
+
+        self.pending.extend(stack)
+        while len(self.pending) > self.max_pending:
+            self.spill_pending()
+        return revealed
+
+    def render(self, origin, shape, xray=False):
+        """
+        Renders a window of the board, like minesweeper.render_nd.
+
+        Parameters:
+           origin (tuple): coordinates of the first cell of the window
+           shape (tuple): dimensions of the window
+           xray (bool): Whether to reveal all tiles
+
+        Returns: an N-D array of strings (nested lists)
+        """
+
+        table = render_table(len(shape))
+        chars = []
+        for step in product(*(range(d) for d in shape)):
+            chunk, offset = self.locate([o + s for o, s in zip(origin, step)])
+            if xray or chunk['mask'][offset]:
+                chars.append(table[chunk['board'][offset]])
+            else:
+                chars.append('_')
+        return nest_values(chars, shape)
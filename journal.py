@@ -0,0 +1,253 @@
+"""
+Append-only move journal with periodic snapshots.
+
+A journal is a directory holding:
+
+   moves.log                 every dig, as the varint-encoded offset of the
+                             dug cell, in order
+   snapshot-<moves>.msw      the game after <moves> digs, prefixed with the
+                             move count and the position in moves.log where
+                             the following moves start (see storage)
+
+Resuming loads the latest snapshot and replays only the moves logged after
+it.  Replaying from the first snapshot reproduces a whole session.
+"""
+
+import os
+import struct
+
+from minesweeper import cell_to_offset, dig_offsets, offset_to_cell
+from storage import decode_game, encode_game
+
+
+LOG = 'moves.log'
+SNAPSHOT = 'snapshot-{:012d}.msw'
+
+# moves, log position
+SNAPSHOT_HEADER = struct.Struct('<QQ')
+
+
+def encode_varint(n):
+    """
+    Encodes a non-negative integer in 7-bit groups, least significant first.
+
+    Parameters:
+       n (int): integer to encode
+
+    Returns: bytes
+    """
+
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def decode_varints(data):
+    """
+    Decodes consecutive varints.  An incomplete varint at the end (a write
+    cut short) is ignored.
+
+    Parameters:
+       data (bytes): encoded integers
+
+    Returns: a list of integers
+    """
+
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def latest_snapshot(directory):
+    """
+    Finds the snapshot with the most moves in a journal.
+
+    Parameters:
+       directory (str): journal directory
+
+    Returns: the snapshot's path
+    """
+
+    names = [n for n in os.listdir(directory)
+             if n.startswith('snapshot-') and n.endswith('.msw')]
+    if not names:
+        raise FileNotFoundError(f'no snapshot in {directory}')
+    return os.path.join(directory, max(names))
+
+
+def read_snapshot(path):
+    """
+    Reads a snapshot.
+
+    Parameters:
+       path (str): snapshot file
+
+    Returns: a tuple (moves, log position, flat game)
+    """
+
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    moves, position = SNAPSHOT_HEADER.unpack_from(data)
+    return moves, position, decode_game(data[SNAPSHOT_HEADER.size:], flat=True)
+
+
+class Journal:
+    """
+    A game whose digs are journaled.  The game itself is flat, in 'game'.
+    """
+
+    def __init__(self, directory, game, moves, snapshot_every):
+        """
+        Use Journal.create or Journal.resume.
+        """
+
+        self.directory = directory
+        self.game = game
+        self.moves = moves
+        self.snapshot_every = snapshot_every
+        self.log = open(os.path.join(directory, LOG), 'ab')
+
+    @classmethod
+    def create(cls, directory, game, snapshot_every=1000):
+        """
+        Starts a journal for a game (nested-list or flat).
+
+        Args:
+           directory (str): Directory of the journal (created if needed; any
+                            previous journal in it is replaced)
+           game (dict): Game state
+           snapshot_every (int): Number of moves between snapshots
+
+        Returns:
+           A Journal
+
+        >>> import tempfile
+        >>> from minesweeper import new_game_nd
+        >>> path = tempfile.mkdtemp()
+        >>> j = Journal.create(path, new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)]), 2)
+        >>> [j.dig(c) for c in [(0, 3), (0, 3), (0, 1)]]
+        [4, 0, 1]
+        >>> j.close()
+        >>> j = Journal.resume(path)
+        >>> j.moves, j.game['state']
+        (3, 'victory')
+        >>> [(move, state) for move, cell, revealed, state in replay(path)]
+        [(0, 'ongoing'), (1, 'ongoing'), (2, 'victory')]
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name == LOG or name.startswith('snapshot-'):
+                os.remove(os.path.join(directory, name))
+
+        journal = cls(directory, decode_game(encode_game(game), flat=True), 0,
+                      snapshot_every)
+        journal.snapshot()
+        return journal
+
+    @classmethod
+    def resume(cls, directory, snapshot_every=1000):
+        """
+        Reopens a journal: loads its latest snapshot and replays the moves
+        logged after it.
+
+        Args:
+           directory (str): Directory of the journal
+           snapshot_every (int): Number of moves between snapshots
+
+        Returns:
+           A Journal
+        """
+
+        moves, position, game = read_snapshot(latest_snapshot(directory))
+        with open(os.path.join(directory, LOG), 'r+b') as fp:
+            fp.seek(position)
+            data = fp.read()
+
+            # Drop a move whose write was cut short
+            end = len(data)
+            while end and data[end - 1] & 0x80:
+                end -= 1
+            fp.truncate(position + end)
+
+        tail = decode_varints(data[:end])
+
+        for offset in tail:
+            dig_offsets(game, offset)
+
+        return cls(directory, game, moves + len(tail), snapshot_every)
+
+    def dig(self, coordinates):
+        """
+        Digs the game (see minesweeper.dig_nd) and logs the move.
+
+        Args:
+           coordinates (tuple): Where to dig
+
+        Returns:
+           int: number of squares revealed
+        """
+
+        offset = cell_to_offset(self.game['strides'], coordinates)
+        revealed = len(dig_offsets(self.game, offset))
+
+        self.log.write(encode_varint(offset))
+        self.log.flush()
+        self.moves += 1
+
+        if self.moves % self.snapshot_every == 0:
+            self.snapshot()
+        return revealed
+
+    def snapshot(self):
+        """
+        Writes a snapshot of the game.  The file is written under a temporary
+        name and renamed, so a crash never leaves a partial snapshot.
+
+        Returns: nothing
+        """
+
+        self.log.flush()
+        header = SNAPSHOT_HEADER.pack(self.moves, self.log.tell())
+        path = os.path.join(self.directory, SNAPSHOT.format(self.moves))
+        with open(path + '.tmp', 'wb') as fp:
+            fp.write(header + encode_game(self.game))
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        """
+        Closes the log.
+        """
+
+        self.log.close()
+
+
+def replay(directory):
+    """
+    Replays a whole journal from its first snapshot.
+
+    Args:
+       directory (str): Directory of the journal
+
+    Returns:
+       An iterator over (move number, coordinates, squares revealed, state
+       after the move) tuples
+    """
+
+    _, _, game = read_snapshot(os.path.join(directory, SNAPSHOT.format(0)))
+    with open(os.path.join(directory, LOG), 'rb') as fp:
+        offsets = decode_varints(fp.read())
+
+    strides = game['strides']
+    for move, offset in enumerate(offsets):
+        revealed = len(dig_offsets(game, offset))
+        yield move, offset_to_cell(strides, offset), revealed, game['state']
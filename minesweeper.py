@@ -1,5 +1,19 @@
 #!/usr/bin/env python3
 
+import random
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from collections.abc import Mapping
+from functools import lru_cache
+from itertools import chain, count, product
+from math import prod
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 def dump(game):
@@ -15,6 +29,134 @@ def dump(game):
             print(f'{key}:', val)
 
 
+# INSTRUMENTATION
+
+# The Stats object the game functions report to, or None (the default) when
+# instrumentation is disabled; then each instrumented call costs one global
+# lookup and comparison
+_stats = None
+
+
+class Stats:
+    """
+    Counters and per-phase timings reported by the game functions while
+    instrumentation is enabled (see enable_stats).
+
+    Phases are 'construction' (building a board), 'conversion' (between
+    nested-list and flat games), 'flood_fill', 'victory_check' and
+    'render'.  A phase may run inside another one (a nested game is
+    converted while it is dug or rendered), so their times overlap.
+
+    Attributes:
+       counters (dict): counter name -> total
+       phases (dict): phase name -> [calls, total seconds, slowest call]
+       callbacks (list): functions called after every instrumented call as
+                         callback(phase, dimensions, seconds, counts), where
+                         counts holds that call's counters
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.phases = {}
+        self.callbacks = []
+
+    def record(self, phase, dimensions, seconds, counts):
+        """
+        Adds one instrumented call.
+
+        Parameters:
+           phase (str): phase name
+           dimensions (tuple): dimensions of the board
+           seconds (float): time spent in the call
+           counts (dict): counter name -> count for the call
+
+        Returns: nothing
+        """
+
+        entry = self.phases.get(phase)
+        if entry is None:
+            entry = self.phases[phase] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+        for name, n in counts.items():
+            self.counters[name] = self.counters.get(name, 0) + n
+        for callback in self.callbacks:
+            callback(phase, dimensions, seconds, counts)
+
+    def reset(self):
+        """
+        Clears the counters and timings (callbacks are kept).
+        """
+
+        self.counters.clear()
+        self.phases.clear()
+
+    def summary(self):
+        """
+        Gets the counters and timings as plain dictionaries.
+
+        Returns: a dictionary with 'counters' and 'phases', the latter
+            mapping phase names to {'calls', 'seconds', 'max_seconds'}
+        """
+
+        return {
+            'counters': dict(self.counters),
+            'phases': {phase: {'calls': calls, 'seconds': seconds, 'max_seconds': slowest}
+                       for phase, (calls, seconds, slowest) in self.phases.items()}}
+
+
+def enable_stats(stats=None):
+    """
+    Turns instrumentation on: the game functions report to stats from now on.
+
+    Parameters:
+       stats (Stats): object to report to (a new one by default)
+
+    Returns: the Stats object
+
+    >>> stats = enable_stats()
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> sorted(stats.phases)
+    ['construction', 'conversion']
+    >>> stats.reset()
+    >>> dig_nd(g, (0, 3))
+    4
+    >>> {k: stats.counters[k] for k in ('cells_visited', 'neighbor_generations',
+    ...                                 'neighbor_lookups', 'victory_checks')}
+    {'cells_visited': 4, 'neighbor_generations': 2, 'neighbor_lookups': 8, 'victory_checks': 1}
+    >>> disable_stats() is stats
+    True
+    """
+
+    global _stats
+    _stats = Stats() if stats is None else stats
+    return _stats
+
+
+def disable_stats():
+    """
+    Turns instrumentation off.
+
+    Returns: the Stats object that was enabled, or None
+    """
+
+    global _stats
+    stats, _stats = _stats, None
+    return stats
+
+
+def get_stats():
+    """
+    Gets the enabled Stats object.
+
+    Returns: a Stats object, or None when instrumentation is disabled
+    """
+
+    return _stats
+
+
 # 2-D IMPLEMENTATION
 
 
@@ -77,21 +219,8 @@ def get_neighbors_2d(num_rows, num_cols, cell):
     Returns: a set with bomb neighbors as tuples. 
     """
         
-    row = cell[0]
-    col = cell[1]
-    
-    inbound_cells = get_all_cells_2d(num_rows, num_cols)
-
-    neighbors = {(row - 1, col -1), (row - 1, col), (row - 1, col + 1),
-                 (row, col - 1), (row, col + 1),
-                 (row + 1, col - 1), (row + 1, col), (row + 1, col + 1)}
-    
-    cell_neighbors = set()
-    for n in neighbors:
-        if n in inbound_cells:
-            cell_neighbors.add(n)
-            
-    return cell_neighbors
+    cell = tuple(cell)
+    return {n for n in iter_neighbors((num_rows, num_cols), cell) if n != cell}
 
 
 def new_game_2d(num_rows, num_cols, bombs):
@@ -115,6 +244,7 @@ def new_game_2d(num_rows, num_cols, bombs):
         ['.', 3, 1, 0]
         ['.', '.', 1, 0]
     dimensions: (2, 4)
+    hidden_safe: 5
     mask:
         [False, False, False, False]
         [False, False, False, False]
@@ -197,6 +327,7 @@ def dig_2d(game, row, col):
         ['.', 3, 1, 0]
         ['.', '.', 1, 0]
     dimensions: (2, 4)
+    hidden_safe: 0
     mask:
         [False, True, True, True]
         [False, False, True, True]
@@ -215,6 +346,7 @@ def dig_2d(game, row, col):
         ['.', 3, 1, 0]
         ['.', '.', 1, 0]
     dimensions: [2, 4]
+    hidden_safe: 4
     mask:
         [True, True, False, False]
         [False, False, False, False]
@@ -365,22 +497,15 @@ def render_ascii(game, xray=False):
     __1_
     """
 
-    render = render_2d(game, xray)
-        
-    render_ascii = ""
-    for r in range(game['dimensions'][0]):
-        for c in range(game['dimensions'][1]):
-            
-            # Add space for 0s
-            if render[r][c] == '0':
-                render[r][c] = " "
-                
-            render_ascii += render[r][c]
-   
-            # Separate rows
-            if c + 1 == game['dimensions'][1]:
-                render_ascii += "\n"
-    return render_ascii[:-1]
+    if _stats is not None:
+        start = perf_counter()
+
+    text = '\n'.join(iter_ascii_rows(game, xray))
+
+    if _stats is not None:
+        _stats.record('render', game['dimensions'], perf_counter() - start,
+                      {'cells_rendered': prod(game['dimensions'])})
+    return text
     
     
 # N-D IMPLEMENTATION
@@ -404,6 +529,95 @@ def initialize_tensor_board(dimensions, value):
     return [initialize_tensor_board(dimensions[1:], value) for j in range(dimensions[0])]
 
 
+@lru_cache(maxsize=128)
+def neighbor_table(dimensions):
+    """
+    Precomputes the neighbor offset table of a board.  The table is cached
+    per dimensions tuple, so it is built once per board shape.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+
+    Returns: a tuple (strides, deltas, offsets), where deltas are the 3^N
+        coordinate steps to a neighbor (the cell itself included) and
+        offsets the same steps in a flat board
+
+    >>> strides, deltas, offsets = neighbor_table((2, 4))
+    >>> deltas[:4], offsets[:4]
+    (((-1, -1), (-1, 0), (-1, 1), (0, -1)), (-5, -4, -3, -1))
+    """
+
+    strides = get_strides(dimensions)
+    deltas = tuple(product((-1, 0, 1), repeat=len(dimensions)))
+    offsets = tuple(cell_to_offset(strides, d) for d in deltas)
+    return strides, deltas, offsets
+
+
+def iter_neighbors(dimensions, cell):
+    """
+    Iterates over the inbound neighbors of a cell (the cell included).  The
+    steps along each axis are clipped to the board once, so no neighbor is
+    generated and then thrown away.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       cell (tuple): cell coordinates
+
+    Returns: an iterator over neighbor coordinate tuples
+    """
+
+    return product(*[range(c - 1 if c else 0, c + 2 if c + 2 <= d else d)
+                     for c, d in zip(cell, dimensions)])
+
+
+# Steps along an axis, indexed by border class: bit 0 set if the cell is not
+# on the low border, bit 1 if it is not on the high border
+AXIS_STEPS = ((0,), (-1, 0), (0, 1), (-1, 0, 1))
+
+
+@lru_cache(maxsize=8192)
+def border_offsets(dimensions, border):
+    """
+    Gets the steps to the inbound neighbors of every cell of a border class
+    in a flat board.  Cached per (dimensions, border class), so each list is
+    built once per board shape.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       border (tuple): border class of each axis (see AXIS_STEPS)
+
+    Returns: a tuple of offset steps (0, the cell itself, included)
+
+    >>> border_offsets((2, 4), (2, 3)), border_offsets((3, 4), (3, 3))
+    ((-1, 0, 1, 3, 4, 5), (-5, -4, -3, -1, 0, 1, 3, 4, 5))
+    """
+
+    strides = get_strides(dimensions)
+    return tuple(sum(d * s for d, s in zip(delta, strides))
+                 for delta in product(*[AXIS_STEPS[b] for b in border]))
+
+
+def neighbor_offsets(dimensions, offset):
+    """
+    Gets the offsets of all inbound neighbors of a cell in a flat board (the
+    cell included), from the cached table of its border class.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       offset (int): the cell's offset
+
+    Returns: a list of neighbor offsets
+    """
+
+    dimensions = tuple(dimensions)
+    border = []
+    rest = offset
+    for s, d in zip(get_strides(dimensions), dimensions):
+        c, rest = divmod(rest, s)
+        border.append((c > 0) | (c < d - 1) << 1)
+    return [offset + o for o in border_offsets(dimensions, tuple(border))]
+
+
 def get_neighbors_tensor(dimensions, cell):
     """    
     Gets all of the cell's neighbors in an nD board.
@@ -414,29 +628,8 @@ def get_neighbors_tensor(dimensions, cell):
     
     Returns: a list of the cell's neighbors
     """
-    
-    # Base Case (1D board)
-    if len(dimensions) == 1:
-        l = []
-        for i in range(-1, 2):
-            c = cell[0] + i
-            
-            # Keep inbound neighbors
-            if 0 <= c < dimensions[0]:
-                l.append((c,))
-        return l
-    
-    # Iterative Case
-    else:
-        l2 = get_neighbors_tensor(dimensions[1:], cell[1:])
-        l3 = []
-        for i in range(-1, 2):
-            c = cell[0] + i
-            if 0 <= c < dimensions[0]:
-                for i in l2:
-                    l3.append((c,) + i)
-        return l3
-    
+
+    return list(iter_neighbors(dimensions, cell))
 
 
 def update_cell_value_tensor(board, cell, value):
@@ -518,220 +711,1688 @@ def get_cell_value_tensor(board, cell):
         return get_cell_value_tensor(board[cell[0]], cell[1:])    
         
         
-def new_game_nd(dimensions, bombs):
-    """
-    Start a new game.
+# FLAT ENGINE
 
-    Return a game state dictionary, with the 'dimensions', 'state', 'board' and
-    'mask' fields adequately initialized.
+# Bombs are stored as this sentinel in flat boards (nested boards use '.')
+BOMB = -1
 
 
-    Args:
-       dimensions (tuple): Dimensions of the board
-       bombs (list): Bomb locations as a list of lists, each an
-                     N-dimensional coordinate
+def get_strides(dimensions):
+    """
+    Gets the row-major strides of a board, i.e. how far apart two cells are
+    in the flat buffer when one coordinate changes by 1.
 
-    Returns:
-       A game state dictionary
+    Parameters:
+       dimensions (tuple): dimensions of the board
 
-    >>> g = new_game_nd((2, 4, 2), [(0, 0, 1), (1, 0, 0), (1, 1, 1)])
-    >>> dump(g)
-    board:
-        [[3, '.'], [3, 3], [1, 1], [0, 0]]
-        [['.', 3], [3, '.'], [1, 1], [0, 0]]
-    dimensions: (2, 4, 2)
-    mask:
-        [[False, False], [False, False], [False, False], [False, False]]
-        [[False, False], [False, False], [False, False], [False, False]]
-    state: ongoing
-    """
-    
-    # Make mask (all False) and board (all 0)
-    board = initialize_tensor_board(dimensions, 0)
-    mask = initialize_tensor_board(dimensions, False)
+    Returns: a tuple of strides, one per dimension
 
-    # For each bomb get its neighbors
-    for b in bombs:
-        bomb_neighbors = get_neighbors_tensor(dimensions, b)  
-        
-        # Update bomb's neighbor values
-        for n in bomb_neighbors: 
-            update_cell_value_tensor(board, n, 1)
-    
-    # Update board with "." for all bombs
-    for i in bombs: 
-        update_cell_value_tensor(board, i, 'bomb')
-        
-    return {
-        'dimensions': dimensions,
-        'board' : board,
-        'mask' : mask,
-        'state': 'ongoing'}    
-    
-    
-def get_all_cells_tensor(dimensions, board):
+    >>> get_strides((2, 4, 2))
+    (8, 2, 1)
     """
-    Gets all cell values of an nD board recursively.
-    
-    Parameters:
-       dimensions (tuple): dimensions of the board  
-       board (list): board of cell values   
-       
-    Returns: a set with all cell coordinates
-    """    
-    
-    # Base Cases:
-    if len(dimensions) == 0:
-        return set()
-    
-    if len(dimensions) == 1:
-        return {(i,) for i in range(dimensions[0])}
-    
-    # Recursive Case
-    all_cells = set()
-    recursive_set = get_all_cells_tensor(dimensions[1:], board[1:])
-    for i in recursive_set:
-        for j in range(dimensions[0]):
-            all_cells.add((j,) + i)
-            
-    return all_cells
-        
 
-def is_won(board, mask, cell_locs):
+    strides = []
+    step = 1
+    for d in reversed(dimensions):
+        strides.append(step)
+        step *= d
+    return tuple(reversed(strides))
+
+
+def cell_to_offset(strides, cell):
     """
-    Checks if the game is won.
+    Maps cell coordinates to a single index in a flat board.
 
     Parameters:
-       board (list): board of cell values 
-       mask (list): board of cell visibility values
-       cell_locs (set): all cell coordinates
-       
-    Returns: True or False
-    """
-    
-    num_cells = 0
-    num_bombs = 0  
-    uncovered_cells = 0  
-    
-    # Get total number of cells, cell values, and uncovered cells
-    for c in cell_locs:
-        num_cells += 1
-        cell_value = get_cell_value_tensor(board, c)
-        cell_mask = get_cell_value_tensor(mask, c)
-        
-        if cell_value != '.' and not cell_mask:
-            break
-        if cell_value == '.':
-            num_bombs += 1   
-        if cell_value != '.' and cell_mask:
-            uncovered_cells += 1  
-            
-    # Check for victory
-    if uncovered_cells == num_cells - num_bombs:
-        return True  
-    return False      
-        
+       strides (tuple): strides of the board
+       cell (tuple): cell coordinates
 
-def dig_nd(game, coordinates, cell_locs = None):
+    Returns: the cell's offset
     """
-    Recursively dig up square at coords and neighboring squares.
 
-    Update the mask to reveal square at coords; then recursively reveal its
-    neighbors, as long as coords does not contain and is not adjacent to a
-    bomb.  Return a number indicating how many squares were revealed.  No
-    action should be taken and 0 returned if the incoming state of the game
-    is not 'ongoing'.
+    offset = 0
+    for c, s in zip(cell, strides):
+        offset += c * s
+    return offset
 
-    The updated state is 'defeat' when at least one bomb is visible on the
-    board after digging, 'victory' when all safe squares (squares that do
-    not contain a bomb) and no bombs are visible, and 'ongoing' otherwise.
 
-    Args:
-       coordinates (tuple): Where to start digging
+def offset_to_cell(strides, offset):
+    """
+    Maps an index in a flat board back to cell coordinates.
 
-    Returns:
-       int: number of squares revealed
+    Parameters:
+       strides (tuple): strides of the board
+       offset (int): the cell's offset
 
-    >>> g = {'dimensions': (2, 4, 2),
-    ...      'board': [[[3, '.'], [3, 3], [1, 1], [0, 0]],
-    ...                [['.', 3], [3, '.'], [1, 1], [0, 0]]],
-    ...      'mask': [[[False, False], [False, True], [False, False], [False, False]],
-    ...               [[False, False], [False, False], [False, False], [False, False]]],
-    ...      'state': 'ongoing'}
-    >>> dig_nd(g, (0, 3, 0))
-    8
-    >>> dump(g)
-    board:
-        [[3, '.'], [3, 3], [1, 1], [0, 0]]
-        [['.', 3], [3, '.'], [1, 1], [0, 0]]
-    dimensions: (2, 4, 2)
-    mask:
-        [[False, False], [False, True], [True, True], [True, True]]
-        [[False, False], [False, False], [True, True], [True, True]]
-    state: ongoing
-    >>> g = {'dimensions': (2, 4, 2),
-    ...      'board': [[[3, '.'], [3, 3], [1, 1], [0, 0]],
-    ...                [['.', 3], [3, '.'], [1, 1], [0, 0]]],
-    ...      'mask': [[[False, False], [False, True], [False, False], [False, False]],
-    ...               [[False, False], [False, False], [False, False], [False, False]]],
-    ...      'state': 'ongoing'}
-    >>> dig_nd(g, (0, 0, 1))
-    1
-    >>> dump(g)
-    board:
-        [[3, '.'], [3, 3], [1, 1], [0, 0]]
-        [['.', 3], [3, '.'], [1, 1], [0, 0]]
-    dimensions: (2, 4, 2)
-    mask:
-        [[False, True], [False, True], [False, False], [False, False]]
-        [[False, False], [False, False], [False, False], [False, False]]
-    state: defeat
+    Returns: cell coordinates as a tuple
     """
-    
-    # Get cell locations once!
-    if cell_locs == None:
-        cell_locs = get_all_cells_tensor(game['dimensions'], game['board'])    
-    
-    # If game is over or won or cell has been revealed already do nothing
-    if game['state'] == 'defeat' or game['state'] == 'victory' or get_cell_value_tensor(game['mask'], coordinates): 
-        return 0
 
+    cell = []
+    for s in strides:
+        c, offset = divmod(offset, s)
+        cell.append(c)
+    return tuple(cell)
 
-    update_cell_value_tensor(game['mask'], coordinates, True)
-    revealed = 1
 
-    
-    # Base Case: If cell has a value other that zero (number or bomb)
-    if get_cell_value_tensor(game['board'], coordinates) == '.': 
-        game['state'] = 'defeat'
-        return revealed
-    
-    # Recursive Case: If cell has a value zero
-    if get_cell_value_tensor(game['board'], coordinates) == 0:
-        
-        neighbors = get_neighbors_tensor(game['dimensions'], coordinates)
-        for n in neighbors:
-            revealed += dig_nd(game, n, cell_locs)
-
-    # Check for victory 
-    if is_won(game['board'], game['mask'], cell_locs):
-        game['state'] = 'victory'
- 
-    return revealed
+def board_typecode(dimensions):
+    """
+    Picks the smallest signed array typecode that can hold every neighbor
+    count of a board (a cell has at most 3^N - 1 neighbors) and BOMB.
 
+    Parameters:
+       dimensions (tuple): dimensions of the board
 
-def render_nd(game, xray=False):
+    Returns: an array typecode
     """
-    Prepare the game for display.
 
-    Returns an N-dimensional array (nested lists) of '_' (hidden squares),
-    '.' (bombs), ' ' (empty squares), or '1', '2', etc. (squares
-    neighboring bombs).  The mask indicates which squares should be
-    visible.  If xray is True (the default is False), the mask is ignored
-    and all cells are shown.
+    max_count = 3 ** len(dimensions) - 1
+    for code in 'bhiq':
+        if max_count < 2 ** (8 * array(code).itemsize - 1):
+            return code
+    raise ValueError(f'too many dimensions: {len(dimensions)}')
 
-    Args:
-       xray (bool): Whether to reveal all tiles or just the ones allowed by
+
+def nest_values(values, dimensions):
+    """
+    Groups a flat, row-major sequence of values into nested lists.
+
+    Parameters:
+       values (list): cell values in row-major order
+       dimensions (tuple): dimensions of the board
+
+    Returns: an nD board (nested lists)
+    """
+
+    values = list(values)
+    for d in reversed(dimensions[1:]):
+        values = [values[i:i + d] for i in range(0, len(values), d)]
+    return values
+
+
+def flatten_values(board, dimensions):
+    """
+    Lists the values of an nD board (nested lists) in row-major order.
+
+    Parameters:
+       board (list): board of cell values
+       dimensions (tuple): dimensions of the board
+
+    Returns: a flat list of cell values
+    """
+
+    for _ in range(len(dimensions) - 1):
+        board = list(chain.from_iterable(board))
+    return board
+
+
+def box_sum_numpy(values, axes):
+    """
+    Sums every 3^N box of a NumPy array (each entry plus its neighbors along
+    the given axes) with one shifted add per direction and axis.  On boolean
+    arrays the sum is an OR, i.e. a dilation.
+
+    Parameters:
+       values (ndarray): array to sum
+       axes (iterable): axes along which neighbors are summed
+
+    Returns: a new array of the same shape and dtype
+    """
+
+    for axis in axes:
+        lower = [slice(None)] * values.ndim
+        upper = [slice(None)] * values.ndim
+        lower[axis] = slice(None, -1)
+        upper[axis] = slice(1, None)
+
+        total = values.copy()
+        total[tuple(upper)] += values[tuple(lower)]
+        total[tuple(lower)] += values[tuple(upper)]
+        values = total
+
+    return values
+
+
+def bomb_counts_numpy(dimensions, offsets):
+    """
+    Builds a board with NumPy: the bombs are scattered into an indicator
+    array, and every neighbor count is computed at once with a 3^N box sum.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       offsets (list): bomb offsets
+
+    Returns: a flat NumPy array with neighbor counts, and BOMB for bombs
+    """
+
+    if np is None:
+        raise ImportError('NumPy is required for bomb_counts_numpy')
+
+    dimensions = tuple(dimensions)
+    counts = np.zeros(prod(dimensions), dtype=board_typecode(dimensions))
+    if not len(offsets):
+        return counts
+
+    np.add.at(counts, offsets, 1)
+    counts = box_sum_numpy(counts.reshape(dimensions), range(len(dimensions)))
+    counts = counts.reshape(-1)
+    counts[offsets] = BOMB
+    return counts
+
+
+def new_game_flat(dimensions, bombs, use_numpy=None):
+    """
+    Start a new game stored in flat buffers.
+
+    Same as new_game_nd, but 'board' is an array of neighbor counts (BOMB for
+    bombs) and 'mask' a bytearray, both indexed by cell_to_offset.  The
+    'strides' field holds the strides used for that mapping, and 'hidden_safe'
+    counts the safe cells that are not revealed yet (the game is won when it
+    reaches 0).
+
+    Args:
+       dimensions (tuple): Dimensions of the board
+       bombs (list): Bomb locations, each an N-dimensional coordinate
+       use_numpy (bool): Whether to build the board with bomb_counts_numpy;
+                         by default NumPy is used when it is installed
+
+    Returns:
+       A flat game state dictionary
+
+    >>> g = new_game_flat((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> g['board']
+    array('b', [-1, 3, 1, 0, -1, -1, 1, 0])
+    >>> g['strides'], g['hidden_safe'], g['state']
+    ((4, 1), 5, 'ongoing')
+    """
+
+    strides = get_strides(dimensions)
+    offsets = [cell_to_offset(strides, b) for b in bombs]
+    return new_game_from_offsets(dimensions, offsets, use_numpy)
+
+
+def new_game_from_offsets(dimensions, offsets, use_numpy=None):
+    """
+    Start a new flat game from bomb offsets rather than coordinates (see
+    new_game_flat).
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       offsets (list): bomb offsets
+       use_numpy (bool): Whether to build the board with bomb_counts_numpy
+
+    Returns: a flat game state dictionary
+    """
+
+    if use_numpy is None:
+        use_numpy = np is not None
+
+    if _stats is not None:
+        start = perf_counter()
+
+    typecode = board_typecode(dimensions)
+
+    if use_numpy:
+        board = array(typecode)
+        board.frombytes(bomb_counts_numpy(dimensions, offsets).tobytes())
+    else:
+        board = array(typecode, [0]) * prod(dimensions)
+
+        # Increment every neighbor of every bomb
+        for b in offsets:
+            for n in neighbor_offsets(dimensions, b):
+                board[n] += 1
+
+        for b in offsets:
+            board[b] = BOMB
+
+    mask = bytearray(len(board))
+
+    game = {
+        'dimensions': dimensions,
+        'strides': get_strides(dimensions),
+        'board': board,
+        'mask': mask,
+        'hidden_safe': len(board) - board.count(BOMB),
+        'state': 'ongoing'}
+
+    if _stats is not None:
+        _stats.record('construction', dimensions, perf_counter() - start, {
+            'cells_built': len(board),
+            'bombs_placed': len(offsets),
+            'neighbor_generations': 0 if use_numpy else len(offsets)})
+    return game
+
+
+def random_bomb_offsets(dimensions, num_bombs, seed=None, safe_cell=None):
+    """
+    Picks distinct random bomb offsets straight from the integer index space,
+    in O(num_bombs) memory.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       num_bombs (int): number of bombs
+       seed: seed of the random generator (see random.Random)
+       safe_cell (tuple): if given, this cell and its neighbors get no bombs
+
+    Returns: a list of bomb offsets
+    """
+
+    excluded = []
+    if safe_cell is not None:
+        excluded = sorted(neighbor_offsets(
+            dimensions, cell_to_offset(get_strides(dimensions), safe_cell)))
+
+    free = prod(dimensions) - len(excluded)
+    if not 0 <= num_bombs <= free:
+        raise ValueError(f'cannot place {num_bombs} bombs in {free} free cells')
+
+    offsets = random.Random(seed).sample(range(free), num_bombs)
+    if not excluded:
+        return offsets
+
+    # Index i of the free cells is offset o such that o - (excluded <= o) == i
+    for i, index in enumerate(offsets):
+        o = index + bisect_right(excluded, index)
+        while o != index + bisect_right(excluded, o):
+            o = index + bisect_right(excluded, o)
+        offsets[i] = o
+    return offsets
+
+
+def random_game_flat(dimensions, num_bombs, seed=None, safe_cell=None):
+    """
+    Start a new flat game with randomly placed bombs (see random_game_nd).
+
+    >>> g = random_game_flat((100, 100, 100), 50000, seed=1, safe_cell=(0, 0, 0))
+    >>> g['hidden_safe'], g['board'][0]
+    (950000, 0)
+    """
+
+    offsets = random_bomb_offsets(dimensions, num_bombs, seed, safe_cell)
+    return new_game_from_offsets(dimensions, offsets)
+
+
+def random_game_nd(dimensions, num_bombs, seed=None, safe_cell=None):
+    """
+    Start a new game with num_bombs randomly placed bombs.
+
+    The bombs are sampled from the offsets of the board, so no list of every
+    cell is built.  The same seed always gives the same board.
+
+    Args:
+       dimensions (tuple): Dimensions of the board
+       num_bombs (int): Number of bombs
+       seed: Seed of the random generator (see random.Random)
+       safe_cell (tuple): If given, this cell (typically the first click) and
+                          its neighbors are kept free of bombs
+
+    Returns:
+       A game state dictionary, as returned by new_game_nd
+
+    >>> g = random_game_nd((3, 3), 8, seed=0, safe_cell=(1, 1))
+    Traceback (most recent call last):
+    ...
+    ValueError: cannot place 8 bombs in 0 free cells
+    >>> g = random_game_nd((4, 4), 7, seed=0, safe_cell=(0, 0))
+    >>> dig_nd(g, (0, 0)) > 1
+    True
+    >>> random_game_nd((4, 4), 7, seed=0, safe_cell=(0, 0)) == random_game_nd(
+    ...     (4, 4), 7, seed=0, safe_cell=(0, 0))
+    True
+    """
+
+    return unflatten_game(random_game_flat(dimensions, num_bombs, seed, safe_cell))
+
+
+class SparseBoard:
+    """
+    Flat board that only stores its bomb offsets.  Neighbor counts are
+    computed on demand and memoized, so memory scales with the number of
+    bombs and visited cells rather than with the board volume.
+    """
+
+    def __init__(self, dimensions, bombs):
+        self.dimensions = tuple(dimensions)
+        self.bombs = set(bombs)
+        self.counts = {}
+        self.size = prod(dimensions)
+
+    def __repr__(self):
+        return f'SparseBoard({self.dimensions}, {sorted(self.bombs)})'
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for offset in range(self.size):
+            yield self.count(offset)
+
+    def __getitem__(self, offset):
+        if isinstance(offset, slice):
+            return [self.count(o) for o in range(*offset.indices(self.size))]
+
+        count = self.counts.get(offset)
+        if count is None:
+            count = self.counts[offset] = self.count(offset)
+        return count
+
+    def count(self, offset):
+        """
+        Computes a cell's value without memoizing it.
+
+        Parameters:
+           offset (int): the cell's offset
+
+        Returns: the number of neighboring bombs, or BOMB
+        """
+
+        if offset in self.bombs:
+            return BOMB
+
+        count = 0
+        for n in neighbor_offsets(self.dimensions, offset):
+            if n in self.bombs:
+                count += 1
+        return count
+
+
+class SparseMask:
+    """
+    Flat mask that stores the set of revealed offsets.
+    """
+
+    def __init__(self, size, revealed=()):
+        self.size = size
+        self.revealed = set(revealed)
+
+    def __repr__(self):
+        return f'SparseMask({self.size}, {sorted(self.revealed)})'
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for offset in range(self.size):
+            yield 1 if offset in self.revealed else 0
+
+    def __getitem__(self, offset):
+        if isinstance(offset, slice):
+            return [1 if o in self.revealed else 0
+                    for o in range(*offset.indices(self.size))]
+        return 1 if offset in self.revealed else 0
+
+    def __setitem__(self, offset, value):
+        if value:
+            self.revealed.add(offset)
+        else:
+            self.revealed.discard(offset)
+
+
+def new_game_sparse(dimensions, bombs):
+    """
+    Start a new game in sparse mode, for huge boards with few bombs.
+
+    Same as new_game_flat, but 'board' is a SparseBoard and 'mask' a
+    SparseMask, so nothing of the size of the board is allocated.  dig_nd,
+    dig_delta and render_nd work on sparse games as on flat ones.
+
+    Args:
+       dimensions (tuple): Dimensions of the board
+       bombs (list): Bomb locations, each an N-dimensional coordinate
+
+    Returns:
+       A sparse game state dictionary
+
+    >>> g = new_game_sparse((20,) * 6, [(0, 0, 0, 0, 0, 0)])
+    >>> g['hidden_safe']
+    63999999
+    >>> dig_nd(g, (0, 0, 0, 0, 0, 1)), g['board'][0]
+    (1, -1)
+    >>> g = new_game_sparse((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_nd(g, (0, 3)), render_nd(g)
+    (4, [['_', '_', '1', ' '], ['_', '_', '1', ' ']])
+    >>> flag_nd(g, (0, 0)), chord_nd(g, (0, 2)), type(g['flags']).__name__
+    (True, 0, 'SparseMask')
+    """
+
+    strides = get_strides(dimensions)
+    board = SparseBoard(dimensions, [cell_to_offset(strides, b) for b in bombs])
+
+    return {
+        'dimensions': dimensions,
+        'strides': strides,
+        'board': board,
+        'mask': SparseMask(len(board)),
+        'hidden_safe': len(board) - len(board.bombs),
+        'state': 'ongoing'}
+
+
+def is_flat(game):
+    """
+    Checks if a game is indexed by offsets (a flat or sparse game) rather
+    than stored in nested lists.
+
+    Parameters:
+       game (dict): Game state
+
+    Returns: True or False
+    """
+
+    if isinstance(game, Game):
+        return False
+    return not isinstance(game['board'], list)
+
+
+def flatten_game(game):
+    """
+    Converts a game with nested-list 'board' and 'mask' to a flat game.  A
+    Game object is not copied: its flat game shares its storage.
+
+    Parameters:
+       game (dict): Game state (nested lists)
+
+    Returns: a new flat game state dictionary
+    """
+
+    if isinstance(game, Game):
+        return game.as_flat()
+
+    if _stats is not None:
+        start = perf_counter()
+
+    dimensions = game['dimensions']
+    values = flatten_values(game['board'], dimensions)
+    board = array(board_typecode(dimensions),
+                  [BOMB if v == '.' else v for v in values])
+    mask = bytearray(flatten_values(game['mask'], dimensions))
+    hidden_safe = 0
+    for v, m in zip(board, mask):
+        if not m and v != BOMB:
+            hidden_safe += 1
+
+    if _stats is not None:
+        _stats.record('conversion', dimensions, perf_counter() - start,
+                      {'cells_converted': len(board)})
+
+    flat = {
+        'dimensions': dimensions,
+        'strides': get_strides(dimensions),
+        'board': board,
+        'mask': mask,
+        'hidden_safe': hidden_safe,
+        'state': game['state']}
+    if 'flags' in game:
+        flat['flags'], flat['flag_counts'] = flat_flags(game)
+    return flat
+
+
+def flat_flags(game):
+    """
+    Converts the flags of a nested-list game (see flag_nd) to the buffers a
+    flat game keeps them in.
+
+    Parameters:
+       game (dict): Game state (nested lists) with flags
+
+    Returns: a tuple (flags bytearray, flag counts array)
+    """
+
+    dimensions = game['dimensions']
+    flags = bytearray(flatten_values(game['flags'], dimensions))
+    counts = array(board_typecode(dimensions), flatten_values(game['flag_counts'], dimensions))
+    return flags, counts
+
+
+def nested_flags(game):
+    """
+    Converts the flags of a flat game (see flag_nd) to the nested lists a
+    nested-list game keeps them in.
+
+    Parameters:
+       game (dict): Game state (flat) with flags
+
+    Returns: a tuple (flags, flag counts) of nested lists
+    """
+
+    dimensions = game['dimensions']
+    counts = game['flag_counts']
+    if isinstance(counts, Counter):
+        counts = [counts[o] for o in range(prod(dimensions))]
+    return (nest_values([f != 0 for f in game['flags']], dimensions),
+            nest_values(list(counts), dimensions))
+
+
+def unflatten_game(game):
+    """
+    Converts a flat game to the nested-list game dictionary that
+    new_game_nd returns (with its 'hidden_safe' counter).
+
+    Parameters:
+       game (dict): Game state (flat)
+
+    Returns: a new game state dictionary with nested lists
+    """
+
+    if _stats is not None:
+        start = perf_counter()
+
+    dimensions = game['dimensions']
+    board = ['.' if v == BOMB else v for v in game['board']]
+    mask = [m != 0 for m in game['mask']]
+
+    nested = {
+        'dimensions': dimensions,
+        'board': nest_values(board, dimensions),
+        'mask': nest_values(mask, dimensions),
+        'hidden_safe': game['hidden_safe'],
+        'state': game['state']}
+    if 'flags' in game:
+        nested['flags'], nested['flag_counts'] = nested_flags(game)
+
+    if _stats is not None:
+        _stats.record('conversion', dimensions, perf_counter() - start,
+                      {'cells_converted': len(board)})
+    return nested
+
+
+def reveal_flat(game, offset):
+    """
+    Reveals the cell at offset and, if it is a 0, flood fills its region.
+
+    The fill uses an explicit stack instead of recursion, so regions of any
+    size can be revealed.  Cells are marked as revealed when they are pushed,
+    so no cell is pushed twice.
+
+    Parameters:
+       game (dict): Game state (flat)
+       offset (int): the cell's offset (must be hidden)
+
+    Returns: a list with the offsets of all newly revealed cells
+    """
+
+    if _stats is not None:
+        start = perf_counter()
+
+    dimensions = game['dimensions']
+    board = game['board']
+    mask = game['mask']
+
+    mask[offset] = 1
+    revealed = [offset]
+    stack = [offset] if board[offset] == 0 else []
+    generations = lookups = 0
+
+    while stack:
+        neighbors = neighbor_offsets(dimensions, stack.pop())
+        generations += 1
+        lookups += len(neighbors)
+        for n in neighbors:
+            if not mask[n]:
+                mask[n] = 1
+                revealed.append(n)
+                if board[n] == 0:
+                    stack.append(n)
+
+    if _stats is not None:
+        _stats.record('flood_fill', dimensions, perf_counter() - start, {
+            'cells_visited': len(revealed),
+            'neighbor_generations': generations,
+            'neighbor_lookups': lookups})
+    return revealed
+
+
+def dig_offsets(game, offset):
+    """
+    Digs the cell at offset of a flat game, following the rules of dig_nd.
+    Flagged cells are not dug (see flag_nd), but a flood fill reveals them
+    and removes their flags.  If the game keeps a 'history' (see
+    take_snapshot), the change (with the flags removed) is recorded there.
+
+    Parameters:
+       game (dict): Game state (flat)
+       offset (int): the cell's offset
+
+    Returns: a list with the offsets of all newly revealed cells
+    """
+
+    history = game.get('history')
+    if history is None:
+        return apply_dig(game, offset)[0]
+
+    state, hidden_safe = game['state'], game['hidden_safe']
+    revealed, cleared = apply_dig(game, offset)
+    if revealed:
+        history.record(state, hidden_safe, revealed, cleared)
+    return revealed
+
+
+def apply_dig(game, offset):
+    """
+    Digs the cell at offset of a flat game like dig_offsets, without
+    recording the change in its history.
+
+    Parameters:
+       game (dict): Game state (flat)
+       offset (int): the cell's offset
+
+    Returns: a tuple (offsets of the newly revealed cells, offsets of the
+        cells whose flags were removed)
+    """
+
+    flags = game.get('flags')
+    if game['state'] != 'ongoing' or game['mask'][offset] or (
+            flags is not None and flags[offset]):
+        return [], []
+
+    revealed = reveal_flat(game, offset)
+
+    # A flood fill may reveal wrongly flagged cells
+    cleared = []
+    if flags is not None:
+        for o in revealed:
+            if flags[o]:
+                set_flag(game, o, False)
+                cleared.append(o)
+
+    if _stats is not None:
+        start = perf_counter()
+
+    if game['board'][offset] == BOMB:
+        game['state'] = 'defeat'
+    else:
+        game['hidden_safe'] -= len(revealed)
+        if game['hidden_safe'] == 0:
+            game['state'] = 'victory'
+
+    if _stats is not None:
+        _stats.record('victory_check', game['dimensions'], perf_counter() - start,
+                      {'victory_checks': 1})
+    return revealed, cleared
+
+
+def reveal_nested(game, coordinates):
+    """
+    Reveals a cell of a nested-list game and, if it is a 0, flood fills its
+    region, like reveal_flat.  Neighbors are visited one row (a run along
+    the last dimension) at a time, so each row is looked up once per cell
+    expanded.
+
+    Parameters:
+       game (dict): Game state (nested lists)
+       coordinates (tuple): the cell's coordinates (must be hidden)
+
+    Returns: a list with the coordinates of all newly revealed cells
+    """
+
+    if _stats is not None:
+        start = perf_counter()
+
+    dimensions = game['dimensions']
+    board = game['board']
+    mask = game['mask']
+    width = dimensions[-1]
+
+    cell = tuple(coordinates)
+    board_row = board
+    mask_row = mask
+    for c in cell[:-1]:
+        board_row = board_row[c]
+        mask_row = mask_row[c]
+    mask_row[cell[-1]] = True
+    revealed = [cell]
+    stack = [cell] if board_row[cell[-1]] == 0 else []
+    generations = lookups = 0
+
+    while stack:
+        cell = stack.pop()
+        generations += 1
+        last = cell[-1]
+        columns = range(last - 1 if last else 0, last + 2 if last + 2 <= width else width)
+        for prefix in iter_neighbors(dimensions[:-1], cell[:-1]):
+            board_row = board
+            mask_row = mask
+            for c in prefix:
+                board_row = board_row[c]
+                mask_row = mask_row[c]
+            lookups += len(columns)
+            for c in columns:
+                if not mask_row[c]:
+                    mask_row[c] = True
+                    n = prefix + (c,)
+                    revealed.append(n)
+                    if board_row[c] == 0:
+                        stack.append(n)
+
+    if _stats is not None:
+        _stats.record('flood_fill', dimensions, perf_counter() - start, {
+            'cells_visited': len(revealed),
+            'neighbor_generations': generations,
+            'neighbor_lookups': lookups})
+    return revealed
+
+
+def count_hidden_safe(game):
+    """
+    Counts the safe cells of a nested-list game that are not revealed yet.
+
+    Parameters:
+       game (dict): Game state (nested lists)
+
+    Returns: the number of hidden safe cells
+    """
+
+    dimensions = game['dimensions']
+    board = flatten_values(game['board'], dimensions)
+    mask = flatten_values(game['mask'], dimensions)
+    return sum(1 for v, m in zip(board, mask) if v != '.' and not m)
+
+
+def dig_nested(game, coordinates):
+    """
+    Digs a cell of a nested-list game in place, following the rules of
+    dig_nd.  The game's 'hidden_safe' count (counted once if the game has
+    none) is decremented by the number of revealed cells, so victory is
+    checked in O(1).  Code that changes 'board' or 'mask' directly should
+    keep 'hidden_safe' up to date (or delete it).
+
+    Parameters:
+       game (dict): Game state (nested lists)
+       coordinates (tuple): Where to start digging
+
+    Returns: a list with the coordinates of all newly revealed cells
+    """
+
+    flags = game.get('flags')
+    if game['state'] != 'ongoing' or get_cell_value_tensor(game['mask'], coordinates) or (
+            flags is not None and get_cell_value_tensor(flags, coordinates)):
+        return []
+
+    if 'hidden_safe' not in game:
+        game['hidden_safe'] = count_hidden_safe(game)
+
+    revealed = reveal_nested(game, coordinates)
+
+    # A flood fill may reveal wrongly flagged cells
+    if flags is not None:
+        for cell in revealed:
+            if get_cell_value_tensor(flags, cell):
+                set_nested_flag(game, cell, False)
+
+    if _stats is not None:
+        start = perf_counter()
+
+    if get_cell_value_tensor(game['board'], coordinates) == '.':
+        game['state'] = 'defeat'
+    else:
+        game['hidden_safe'] -= len(revealed)
+        if game['hidden_safe'] == 0:
+            game['state'] = 'victory'
+
+    if _stats is not None:
+        _stats.record('victory_check', game['dimensions'], perf_counter() - start,
+                      {'victory_checks': 1})
+    return revealed
+
+
+def new_game_nd(dimensions, bombs):
+    """
+    Start a new game.
+
+    Return a game state dictionary, with the 'dimensions', 'state', 'board' and
+    'mask' fields adequately initialized.
+
+
+    Args:
+       dimensions (tuple): Dimensions of the board
+       bombs (list): Bomb locations as a list of lists, each an
+                     N-dimensional coordinate
+
+    Returns:
+       A game state dictionary
+
+    >>> g = new_game_nd((2, 4, 2), [(0, 0, 1), (1, 0, 0), (1, 1, 1)])
+    >>> dump(g)
+    board:
+        [[3, '.'], [3, 3], [1, 1], [0, 0]]
+        [['.', 3], [3, '.'], [1, 1], [0, 0]]
+    dimensions: (2, 4, 2)
+    hidden_safe: 13
+    mask:
+        [[False, False], [False, False], [False, False], [False, False]]
+        [[False, False], [False, False], [False, False], [False, False]]
+    state: ongoing
+    """
+
+    return unflatten_game(new_game_flat(dimensions, bombs))
+
+
+def get_all_cells_tensor(dimensions, board):
+    """
+    Gets all cell values of an nD board recursively.
+    
+    Parameters:
+       dimensions (tuple): dimensions of the board  
+       board (list): board of cell values   
+       
+    Returns: a set with all cell coordinates
+    """    
+    
+    # Base Cases:
+    if len(dimensions) == 0:
+        return set()
+    
+    if len(dimensions) == 1:
+        return {(i,) for i in range(dimensions[0])}
+    
+    # Recursive Case
+    all_cells = set()
+    recursive_set = get_all_cells_tensor(dimensions[1:], board[1:])
+    for i in recursive_set:
+        for j in range(dimensions[0]):
+            all_cells.add((j,) + i)
+            
+    return all_cells
+        
+
+def is_won(board, mask, cell_locs):
+    """
+    Checks if the game is won.
+
+    Parameters:
+       board (list): board of cell values 
+       mask (list): board of cell visibility values
+       cell_locs (set): all cell coordinates
+       
+    Returns: True or False
+    """
+    
+    if _stats is not None:
+        start = perf_counter()
+
+    num_cells = 0
+    num_bombs = 0  
+    uncovered_cells = 0  
+    
+    # Get total number of cells, cell values, and uncovered cells
+    for c in cell_locs:
+        num_cells += 1
+        cell_value = get_cell_value_tensor(board, c)
+        cell_mask = get_cell_value_tensor(mask, c)
+        
+        if cell_value != '.' and not cell_mask:
+            break
+        if cell_value == '.':
+            num_bombs += 1   
+        if cell_value != '.' and cell_mask:
+            uncovered_cells += 1  
+            
+    if _stats is not None:
+        dimensions = []
+        row = board
+        while isinstance(row, list):
+            dimensions.append(len(row))
+            row = row[0] if row else None
+        # get_cell_value_tensor recurses once per dimension, on board and mask
+        _stats.record('victory_check', tuple(dimensions), perf_counter() - start, {
+            'is_won_scans': 1,
+            'cells_scanned': num_cells,
+            'recursive_lookups': 2 * num_cells * len(dimensions)})
+
+    # Check for victory
+    if uncovered_cells == num_cells - num_bombs:
+        return True  
+    return False      
+        
+
+def dig_nd(game, coordinates, cell_locs = None):
+    """
+    Recursively dig up square at coords and neighboring squares.
+
+    Update the mask to reveal square at coords; then recursively reveal its
+    neighbors, as long as coords does not contain and is not adjacent to a
+    bomb.  Return a number indicating how many squares were revealed.  No
+    action should be taken and 0 returned if the incoming state of the game
+    is not 'ongoing'.  The game may be a nested-list game (new_game_nd, dug
+    in place, see dig_nested), a flat one (new_game_flat) or a Game.
+
+    The updated state is 'defeat' when at least one bomb is visible on the
+    board after digging, 'victory' when all safe squares (squares that do
+    not contain a bomb) and no bombs are visible, and 'ongoing' otherwise.
+
+    Args:
+       coordinates (tuple): Where to start digging
+       cell_locs: Unused, kept for backwards compatibility
+
+    Returns:
+       int: number of squares revealed
+
+    >>> g = {'dimensions': (2, 4, 2),
+    ...      'board': [[[3, '.'], [3, 3], [1, 1], [0, 0]],
+    ...                [['.', 3], [3, '.'], [1, 1], [0, 0]]],
+    ...      'mask': [[[False, False], [False, True], [False, False], [False, False]],
+    ...               [[False, False], [False, False], [False, False], [False, False]]],
+    ...      'state': 'ongoing'}
+    >>> dig_nd(g, (0, 3, 0))
+    8
+    >>> dump(g)
+    board:
+        [[3, '.'], [3, 3], [1, 1], [0, 0]]
+        [['.', 3], [3, '.'], [1, 1], [0, 0]]
+    dimensions: (2, 4, 2)
+    hidden_safe: 4
+    mask:
+        [[False, False], [False, True], [True, True], [True, True]]
+        [[False, False], [False, False], [True, True], [True, True]]
+    state: ongoing
+    >>> g = {'dimensions': (2, 4, 2),
+    ...      'board': [[[3, '.'], [3, 3], [1, 1], [0, 0]],
+    ...                [['.', 3], [3, '.'], [1, 1], [0, 0]]],
+    ...      'mask': [[[False, False], [False, True], [False, False], [False, False]],
+    ...               [[False, False], [False, False], [False, False], [False, False]]],
+    ...      'state': 'ongoing'}
+    >>> dig_nd(g, (0, 0, 1))
+    1
+    >>> dump(g)
+    board:
+        [[3, '.'], [3, 3], [1, 1], [0, 0]]
+        [['.', 3], [3, '.'], [1, 1], [0, 0]]
+    dimensions: (2, 4, 2)
+    hidden_safe: 12
+    mask:
+        [[False, True], [False, True], [False, False], [False, False]]
+        [[False, False], [False, False], [False, False], [False, False]]
+    state: defeat
+
+    Changes made by hand are seen by the next dig:
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> g['board'][0][3] = '.'
+    >>> dig_nd(g, (0, 3)), g['state']
+    (1, 'defeat')
+    """
+
+    if is_flat(game):
+        return len(dig_offsets(game, cell_to_offset(game['strides'], coordinates)))
+    if isinstance(game, Game):
+        return game.dig(coordinates)
+    return len(dig_nested(game, coordinates))
+
+
+def update_nested_game(game, flat, revealed):
+    """
+    Copies revealed cells (clearing their flags), the state and the hidden
+    safe count of a flat copy (see flatten_game) back into the nested-list
+    game it was made from.
+
+    Parameters:
+       game (dict): Game state (nested lists)
+       flat (dict): flat copy of game
+       revealed (list): offsets revealed in flat since the copy was made
+
+    Returns: nothing
+    """
+
+    if isinstance(game, Game):
+        game.absorb(flat, revealed)
+        return
+
+    strides = flat['strides']
+    flags = game.get('flags')
+    for offset in revealed:
+        row = game['mask']
+        cell = offset_to_cell(strides, offset)
+        for c in cell[:-1]:
+            row = row[c]
+        row[cell[-1]] = True
+        if flags is not None and get_cell_value_tensor(flags, cell):
+            set_nested_flag(game, cell, False)
+    game['hidden_safe'] = flat['hidden_safe']
+    game['state'] = flat['state']
+
+
+def dig_many(game, coordinates):
+    """
+    Apply a sequence of digs in order.  Digging stops at the first move that
+    ends the game.
+
+    Args:
+       coordinates (list): Where to dig, one coordinate tuple per move
+
+    Returns:
+       A list with the number of squares each applied move revealed; it is
+       shorter than coordinates if the game ended early
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_many(g, [(0, 3), (0, 3), (0, 1), (0, 0)])
+    [4, 0, 1]
+    >>> g['state']
+    'victory'
+    """
+
+    counts = []
+    for c in coordinates:
+        if game['state'] != 'ongoing':
+            break
+        counts.append(dig_nd(game, c))
+    return counts
+
+
+def dig_delta(game, coordinates):
+    """
+    Dig like dig_nd, but describe what changed so a client can patch its
+    display instead of rendering the whole board again.
+
+    Args:
+       coordinates (tuple): Where to start digging
+
+    Returns:
+       A dictionary with 'cells', a list of (coordinates, display value)
+       pairs for the newly revealed cells (as rendered by render_nd), and
+       'previous_state' / 'state', the game state before and after digging
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_delta(g, (0, 2))
+    {'cells': [((0, 2), '1')], 'previous_state': 'ongoing', 'state': 'ongoing'}
+    >>> dig_delta(g, (0, 3))['cells']
+    [((0, 3), ' '), ((1, 2), '1'), ((1, 3), ' ')]
+    >>> dig_delta(g, (0, 1))
+    {'cells': [((0, 1), '3')], 'previous_state': 'ongoing', 'state': 'victory'}
+    """
+
+    previous_state = game['state']
+    table = render_table(len(game['dimensions']))
+
+    if is_flat(game) or isinstance(game, Game):
+        flat = game if is_flat(game) else game.as_flat()
+        strides = flat['strides']
+        revealed = dig_offsets(flat, cell_to_offset(strides, coordinates))
+        if flat is not game:
+            game.absorb(flat, revealed)
+        board = flat['board']
+        cells = [(offset_to_cell(strides, o), table[board[o]]) for o in revealed]
+    else:
+        board = game['board']
+        cells = []
+        for c in dig_nested(game, coordinates):
+            value = get_cell_value_tensor(board, c)
+            cells.append((c, table[BOMB if value == '.' else value]))
+
+    return {
+        'cells': cells,
+        'previous_state': previous_state,
+        'state': game['state']}
+
+
+def set_flag(game, offset, flagged):
+    """
+    Flags or unflags a cell (flags are for hidden cells, see flag_nd), and
+    updates the counts of adjacent flags of its neighbors.  The 'flags' and
+    'flag_counts' of a flat game are added to it on first use: a bytearray
+    and an array for an in-memory board, otherwise (sparse games, see
+    new_game_sparse, and memory-mapped games) a SparseMask and a Counter, so
+    their size scales with the number of flags.
+
+    Parameters:
+       game (dict): Game state (flat)
+       offset (int): the cell's offset
+       flagged (bool): Whether the cell should be flagged
+
+    Returns: True if the flag changed, False otherwise
+    """
+
+    if 'flags' not in game:
+        if not flagged:
+            return False
+        size = prod(game['dimensions'])
+        if isinstance(game['board'], array):
+            game['flags'] = bytearray(size)
+            game['flag_counts'] = array(board_typecode(game['dimensions']), [0]) * size
+        else:
+            game['flags'] = SparseMask(size)
+            game['flag_counts'] = Counter()
+
+    flags = game['flags']
+    if bool(flags[offset]) == flagged:
+        return False
+
+    flags[offset] = flagged
+    step = 1 if flagged else -1
+    counts = game['flag_counts']
+    for n in neighbor_offsets(game['dimensions'], offset):
+        counts[n] += step
+    return True
+
+
+def set_nested_flag(game, coordinates, flagged):
+    """
+    Flags or unflags a cell of a nested-list game, like set_flag.  The game
+    keeps its 'flags' (booleans) and 'flag_counts' in nested lists, added on
+    first use.
+
+    Parameters:
+       game (dict): Game state (nested lists)
+       coordinates (tuple): the cell's coordinates
+       flagged (bool): Whether the cell should be flagged
+
+    Returns: True if the flag changed, False otherwise
+    """
+
+    dimensions = game['dimensions']
+    if 'flags' not in game:
+        if not flagged:
+            return False
+        game['flags'] = initialize_tensor_board(dimensions, False)
+        game['flag_counts'] = initialize_tensor_board(dimensions, 0)
+
+    row = game['flags']
+    for c in coordinates[:-1]:
+        row = row[c]
+    if row[coordinates[-1]] == flagged:
+        return False
+
+    row[coordinates[-1]] = flagged
+    step = 1 if flagged else -1
+    last = coordinates[-1]
+    width = dimensions[-1]
+    columns = range(last - 1 if last else 0, last + 2 if last + 2 <= width else width)
+    for prefix in iter_neighbors(dimensions[:-1], tuple(coordinates[:-1])):
+        row = game['flag_counts']
+        for c in prefix:
+            row = row[c]
+        for c in columns:
+            row[c] += step
+    return True
+
+
+def chord_nested(game, coordinates):
+    """
+    Chords a cell of a nested-list game in place, like chord_offsets.
+
+    Parameters:
+       game (dict): Game state (nested lists)
+       coordinates (tuple): the cell's coordinates
+
+    Returns: a list with the coordinates of all newly revealed cells
+    """
+
+    counts = game.get('flag_counts')
+    value = get_cell_value_tensor(game['board'], coordinates)
+    if (counts is None or game['state'] != 'ongoing' or value == '.' or value <= 0
+            or not get_cell_value_tensor(game['mask'], coordinates)
+            or get_cell_value_tensor(counts, coordinates) != value):
+        return []
+
+    revealed = []
+    for n in iter_neighbors(game['dimensions'], tuple(coordinates)):
+        revealed.extend(dig_nested(game, n))
+    return revealed
+
+
+def chord_offsets(game, offset):
+    """
+    Chords the cell at offset of a flat game: if it is a revealed number
+    with as many flagged neighbors, digs all its unflagged hidden neighbors
+    (see chord_nd).  The digs are recorded as one change in the game's
+    history, so undo takes back the whole chord.
+
+    Parameters:
+       game (dict): Game state (flat)
+       offset (int): the cell's offset
+
+    Returns: a list with the offsets of all newly revealed cells
+    """
+
+    counts = game.get('flag_counts')
+    value = game['board'][offset]
+    if (counts is None or game['state'] != 'ongoing' or not game['mask'][offset]
+            or value <= 0 or counts[offset] != value):
+        return []
+
+    state, hidden_safe = game['state'], game['hidden_safe']
+    revealed = []
+    cleared = []
+    for n in neighbor_offsets(game['dimensions'], offset):
+        dug, unflagged = apply_dig(game, n)
+        revealed.extend(dug)
+        cleared.extend(unflagged)
+
+    history = game.get('history')
+    if history is not None and revealed:
+        history.record(state, hidden_safe, revealed, cleared)
+    return revealed
+
+
+def flag_nd(game, coordinates, flagged=True):
+    """
+    Flag (or unflag) a hidden square.  Flagged squares are not dug by
+    dig_nd and are shown as 'F' by render_nd.  Every cell keeps a count of
+    its flagged neighbors, updated here, so chord_nd checks its
+    precondition in O(1).  Works on nested-list and flat games.
+
+    Args:
+       coordinates (tuple): Square to flag
+       flagged (bool): Whether to flag or unflag the square
+
+    Returns:
+       True if the square's flag changed, False otherwise
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> flag_nd(g, (0, 0)), flag_nd(g, (0, 0)), dig_nd(g, (0, 0))
+    (True, False, 0)
+    >>> render_nd(g)
+    [['F', '_', '_', '_'], ['_', '_', '_', '_']]
+    >>> unflag_nd(g, (0, 0))
+    True
+    >>> flag_nd(g, (1, 1)), g['flags'], g['flag_counts'][0]
+    (True, [[False, False, False, False], [False, True, False, False]], [1, 1, 1, 0])
+    >>> g = Game((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> flag_nd(g, (1, 1)), g.render()[1]
+    (True, ['_', 'F', '_', '_'])
+    """
+
+    if isinstance(game, Game):
+        flat = game.as_flat()
+        changed = flag_nd(flat, coordinates, flagged)
+        game.absorb(flat, [])
+        return changed
+
+    if is_flat(game):
+        offset = cell_to_offset(game['strides'], coordinates)
+        revealed = game['mask'][offset]
+    else:
+        revealed = get_cell_value_tensor(game['mask'], coordinates)
+
+    if flagged and (revealed or game['state'] != 'ongoing'):
+        return False
+    if is_flat(game):
+        return set_flag(game, offset, flagged)
+    return set_nested_flag(game, tuple(coordinates), flagged)
+
+
+def unflag_nd(game, coordinates):
+    """
+    Unflag a square (see flag_nd).
+
+    Returns:
+       True if the square was flagged, False otherwise
+    """
+
+    return flag_nd(game, coordinates, False)
+
+
+def chord_nd(game, coordinates):
+    """
+    Chord a revealed number: if as many of its neighbors are flagged as its
+    value, dig all its other hidden neighbors, with the flood fill of
+    dig_nd (a wrong flag makes this dig a bomb).  Otherwise nothing
+    happens.  Works on nested-list and flat games.
+
+    Args:
+       coordinates (tuple): Square to chord
+
+    Returns:
+       int: number of squares revealed
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_nd(g, (0, 2)), chord_nd(g, (0, 2))
+    (1, 0)
+    >>> flag_nd(g, (1, 1))
+    True
+    >>> chord_nd(g, (0, 2)), g['state']
+    (4, 'victory')
+    >>> g = Game((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> g.dig((0, 2)), flag_nd(g, (1, 1)), chord_nd(g, (0, 2))
+    (1, True, 4)
+    """
+
+    if is_flat(game):
+        return len(chord_offsets(game, cell_to_offset(game['strides'], coordinates)))
+
+    if isinstance(game, Game):
+        flat = game.as_flat()
+        revealed = chord_offsets(flat, cell_to_offset(flat['strides'], coordinates))
+        game.absorb(flat, revealed)
+        return len(revealed)
+
+    return len(chord_nested(game, coordinates))
+
+
+class History:
+    """
+    The undo log of a flat game (see take_snapshot): one entry per dig that
+    changed the game, with the state and hidden safe count it replaced and
+    the offsets it revealed and unflagged.
+
+    Every entry gets a new serial number.  A snapshot is a position in the
+    log with the serial of the entry just before it, so a snapshot taken
+    before an undo no longer matches once other digs took the place of the
+    undone ones.  Entries before a position can be released (see
+    release_history), after which snapshots taken before it are refused.
+    """
+
+    __slots__ = ('entries', 'start', 'base', 'serials')
+
+    def __init__(self):
+        self.entries = []  # (serial, state, hidden_safe, revealed, cleared)
+        self.start = 0  # position of entries[0]
+        self.base = 0  # serial of the last released entry, 0 if none
+        self.serials = count(1)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, state, hidden_safe, revealed, cleared):
+        """
+        Adds the entry of a dig.
+
+        Parameters:
+           state (str): state of the game before the dig
+           hidden_safe (int): hidden safe count before the dig
+           revealed (list): offsets the dig revealed
+           cleared (list): offsets the dig unflagged
+
+        Returns: nothing
+        """
+
+        self.entries.append((next(self.serials), state, hidden_safe, revealed, cleared))
+
+    def serial(self, position):
+        """
+        Gets the serial of the entry just before a position of the log.
+        """
+
+        if position > self.start:
+            return self.entries[position - self.start - 1][0]
+        return self.base
+
+    def snapshot(self):
+        """
+        Gets a snapshot of the current position (see take_snapshot).
+        """
+
+        position = self.start + len(self.entries)
+        return (position, self.serial(position))
+
+    def index(self, snapshot):
+        """
+        Checks a snapshot against the log.
+
+        Parameters:
+           snapshot: Value returned by snapshot
+
+        Returns: the number of entries recorded before the snapshot
+        """
+
+        position, serial = snapshot
+        if position < self.start:
+            raise ValueError('the snapshot was released (see release_history)')
+        if position > self.start + len(self.entries) or self.serial(position) != serial:
+            raise ValueError('the snapshot was undone')
+        return position - self.start
+
+    def release(self, snapshot):
+        """
+        Drops the entries recorded before a snapshot.
+        """
+
+        keep = self.index(snapshot)
+        self.base = self.serial(self.start + keep)
+        del self.entries[:keep]
+        self.start += keep
+
+
+def take_snapshot(game):
+    """
+    Marks the current position of a flat game so it can be rolled back.
+
+    The first snapshot starts a 'history' in the game (a History): from
+    then on every dig records the cells it revealed and the state it
+    replaced, so a snapshot and a rollback cost O(cells changed), and the
+    board is never copied.  The history grows with every dig until it is
+    released (see release_history).
+
+    Args:
+       game (dict): Game state (flat)
+
+    Returns:
+       A snapshot to pass to rollback
+
+    >>> g = new_game_flat((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> start = take_snapshot(g)
+    >>> dig_nd(g, (0, 3))
+    4
+    >>> after_first_dig = take_snapshot(g)
+    >>> dig_nd(g, (0, 1)), g['state']
+    (1, 'victory')
+    >>> rollback(g, after_first_dig)
+    >>> render_nd(g), g['state']
+    ([['_', '_', '1', ' '], ['_', '_', '1', ' ']], 'ongoing')
+    >>> dig_nd(g, (0, 0)), g['state']
+    (1, 'defeat')
+    >>> rollback(g, start)
+    >>> render_nd(g), g['hidden_safe'], g['state']
+    ([['_', '_', '_', '_'], ['_', '_', '_', '_']], 5, 'ongoing')
+
+    A snapshot of a position that was undone, then replaced by other digs,
+    is refused:
+
+    >>> dig_nd(g, (0, 3))
+    4
+    >>> undone = take_snapshot(g)
+    >>> undo(g)
+    >>> dig_nd(g, (1, 3))
+    4
+    >>> rollback(g, undone)
+    Traceback (most recent call last):
+    ...
+    ValueError: the snapshot was undone
+
+    A Game keeps its history in its flat storage:
+
+    >>> g = Game((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> start = take_snapshot(g)
+    >>> g.dig((0, 3)), g['mask'][0]
+    (4, [False, False, True, True])
+    >>> rollback(g, start)
+    >>> g['mask'][0], g['hidden_safe']
+    ([False, False, False, False], 5)
+
+    Nested-list games keep no history:
+
+    >>> take_snapshot(new_game_nd((2, 4), [(0, 0)]))
+    Traceback (most recent call last):
+    ...
+    TypeError: snapshots need a flat game (see flatten_game)
+    """
+
+    check_history_game(game)
+    if isinstance(game, Game):
+        flat = game.as_flat()
+        snapshot = take_snapshot(flat)
+        game.absorb(flat, [])
+        return snapshot
+
+    history = game.get('history')
+    if history is None:
+        history = game['history'] = History()
+    return history.snapshot()
+
+
+def check_history_game(game):
+    """
+    Checks that a game can keep a history (see take_snapshot).
+
+    Parameters:
+       game (dict): Game state
+
+    Returns: nothing
+    """
+
+    if not (is_flat(game) or isinstance(game, Game)):
+        raise TypeError('snapshots need a flat game (see flatten_game)')
+
+
+def game_history(game):
+    """
+    Gets the history of a game that keeps one (see take_snapshot).
+
+    Parameters:
+       game (dict): Game state (flat)
+
+    Returns: the game's History
+    """
+
+    check_history_game(game)
+    history = game.get('history')
+    if history is None:
+        raise ValueError('the game keeps no history (see take_snapshot)')
+    return history
+
+
+def rewind(game, history, keep):
+    """
+    Undoes the digs of the entries of a history after the first keep.
+
+    Parameters:
+       game (dict): Game state (flat)
+       history (History): the game's history
+       keep (int): number of entries to keep
+
+    Returns: nothing
+    """
+
+    if isinstance(game, Game):
+        flat = game.as_flat()
+        rewind(flat, history, keep)
+        game.absorb(flat, [])
+        game.release_views()
+        return
+
+    mask = game['mask']
+    entries = history.entries
+    while len(entries) > keep:
+        _, state, hidden_safe, revealed, cleared = entries.pop()
+        for offset in revealed:
+            mask[offset] = 0
+        for offset in cleared:
+            set_flag(game, offset, True)
+        game['state'] = state
+        game['hidden_safe'] = hidden_safe
+
+
+def rollback(game, snapshot):
+    """
+    Undoes every dig made on a flat game (or a Game) since a snapshot,
+    putting back the flags their flood fills removed.  Raises ValueError if
+    the snapshot was released (see release_history) or undone.
+
+    Args:
+       game (dict): Game state (flat)
+       snapshot: Value returned by take_snapshot
+
+    Returns:
+       nothing
+    """
+
+    history = game_history(game)
+    rewind(game, history, history.index(snapshot))
+
+
+def undo(game):
+    """
+    Undoes the last dig that changed a flat game (it must keep a history,
+    see take_snapshot).  Does nothing if no dig was recorded (or the
+    recorded ones were released).
+
+    Args:
+       game (dict): Game state (flat)
+
+    Returns:
+       nothing
+
+    >>> g = new_game_flat((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> take_snapshot(g)
+    (0, 0)
+    >>> undo(g)
+    >>> dig_nd(g, (0, 3)), dig_nd(g, (0, 2)), dig_nd(g, (0, 1))
+    (4, 0, 1)
+    >>> undo(g)
+    >>> render_nd(g), g['state']
+    ([['_', '_', '1', ' '], ['_', '_', '1', ' ']], 'ongoing')
+    >>> undo(g)
+    >>> undo(g)
+    >>> render_nd(g)
+    [['_', '_', '_', '_'], ['_', '_', '_', '_']]
+
+    Flags removed by a flood fill come back:
+
+    >>> flag_nd(g, (0, 3)), dig_nd(g, (1, 3)), render_nd(g)[0]
+    (True, 4, ['_', '_', '1', ' '])
+    >>> undo(g)
+    >>> render_nd(g)[0], g['flags'][3]
+    (['_', '_', '_', 'F'], 1)
+
+    A chord is undone as a whole:
+
+    >>> g = new_game_flat((3, 3), [(0, 0)])
+    >>> dig_nd(g, (1, 1)), flag_nd(g, (0, 0)), take_snapshot(g)
+    (1, True, (0, 0))
+    >>> chord_nd(g, (1, 1)), g['state']
+    (7, 'victory')
+    >>> undo(g)
+    >>> render_nd(g), g['state']
+    ([['F', '_', '_'], ['_', '1', '_'], ['_', '_', '_']], 'ongoing')
+    """
+
+    history = game_history(game)
+    if len(history):
+        rewind(game, history, len(history) - 1)
+
+
+def release_history(game, snapshot=None):
+    """
+    Frees the history recorded before a snapshot (by default, all of it):
+    the game can no longer be rolled back past it.  Snapshots taken before
+    it are refused by rollback from then on.
+
+    Args:
+       game (dict): Game state (flat)
+       snapshot: Value returned by take_snapshot, or None for the current
+                 position
+
+    Returns:
+       nothing
+
+    >>> g = new_game_flat((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> start = take_snapshot(g)
+    >>> dig_nd(g, (0, 3)), len(g['history'])
+    (4, 1)
+    >>> release_history(g)
+    >>> len(g['history']), undo(g), g['hidden_safe']
+    (0, None, 1)
+    >>> rollback(g, start)
+    Traceback (most recent call last):
+    ...
+    ValueError: the snapshot was released (see release_history)
+    """
+
+    history = game_history(game)
+    history.release(history.snapshot() if snapshot is None else snapshot)
+
+
+def render_nd(game, xray=False):
+    """
+    Prepare the game for display.
+
+    Returns an N-dimensional array (nested lists) of '_' (hidden squares),
+    'F' (flagged hidden squares, see flag_nd), '.' (bombs), ' ' (empty
+    squares), or '1', '2', etc. (squares neighboring bombs).  The mask
+    indicates which squares should be visible.  If xray is True (the default
+    is False), the mask is ignored and all cells are shown.  Works on
+    nested-list and flat games.
+
+    Args:
+       xray (bool): Whether to reveal all tiles or just the ones allowed by
                     the mask
 
     Returns:
@@ -752,31 +2413,354 @@ def render_nd(game, xray=False):
      [['.', '3'], ['3', '.'], ['1', '1'], [' ', ' ']]]
     """
 
-    # Get all cell locations
-    cell_locs = get_all_cells_tensor(game['dimensions'], game['board'])
-    
-    # Initialize render baord with 0s
-    render = initialize_tensor_board(game['dimensions'], 0)
-    
-    
-    for c in cell_locs:
-        # If xray, show board values
-        if xray:
-            update_render_value_tensor(render, c, get_cell_value_tensor(game['board'], c))
-        else:
-            if get_cell_value_tensor(game['mask'], c) == False:
-                update_render_value_tensor(render, c, '_') 
-                
-            else:
-                cell_value = get_cell_value_tensor(game['board'], c)
-                
-                # Hide 0s with spaces
-                if cell_value == 0:
-                    update_render_value_tensor(render, c, ' ') 
+    if _stats is not None:
+        start = perf_counter()
+
+    if not is_flat(game):
+        game = flatten_game(game)
+
+    render = render_values(game['dimensions'], game['board'], game['mask'], xray,
+                           game.get('flags'))
+    render = nest_values(render, game['dimensions'])
+
+    if _stats is not None:
+        _stats.record('render', game['dimensions'], perf_counter() - start,
+                      {'cells_rendered': len(game['board'])})
+    return render
+
+
+@lru_cache(maxsize=128)
+def render_table(ndim):
+    """
+    Gets the display characters of an nD board, indexed by flat board value.
+    BOMB (-1) indexes the last entry.
+
+    Parameters:
+       ndim (int): number of dimensions of the board
+
+    Returns: a tuple of display strings
+
+    >>> render_table(1)
+    (' ', '1', '2', '.')
+    """
+
+    return (' ',) + tuple(str(v) for v in range(1, 3 ** ndim)) + ('.',)
+
+
+def render_values(dimensions, board, mask, xray=False, flags=None):
+    """
+    Maps flat board and mask values to display characters in bulk, through
+    render_table (vectorized with NumPy when it is installed).  Hidden
+    flagged cells are shown as 'F'.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       board (array): flat board values (or a slice of them)
+       mask (bytearray): flat mask values, aligned with board
+       xray (bool): Whether to ignore the mask
+       flags: flat flags aligned with board (a bytearray or a SparseMask),
+              or None
+
+    Returns: a flat list of display characters
+    """
+
+    table = render_table(len(dimensions))
+    sparse_flags = isinstance(flags, SparseMask)
+
+    if np is not None and isinstance(board, (array, memoryview)):
+        codes = np.frombuffer(board, dtype=board_typecode(dimensions))
+        chars = np.array(table)[codes]
+        if not xray:
+            hidden = '_'
+            if flags is not None:
+                hidden = np.full(len(chars), '_')
+                if sparse_flags:
+                    hidden[sorted(flags.revealed)] = 'F'
                 else:
-                    update_render_value_tensor(render, c, cell_value) 
+                    hidden[np.frombuffer(flags, dtype=np.uint8) != 0] = 'F'
+            chars = np.where(np.frombuffer(mask, dtype=np.uint8), chars, hidden)
+        return chars.tolist()
+
+    if xray:
+        return [table[v] for v in board]
+    if flags is None or sparse_flags:
+        chars = [table[v] if m else '_' for v, m in zip(board, mask)]
+        if sparse_flags:
+            for o in flags.revealed:
+                if not mask[o]:
+                    chars[o] = 'F'
+        return chars
+    hidden = ('_', 'F')
+    return [table[v] if m else hidden[f] for v, m, f in zip(board, mask, flags)]
+
+
+def iter_ascii_rows(game, xray=False):
+    """
+    Renders a game one ASCII row (a run along the last dimension) at a time.
+    Rows are rendered in blocks, so memory stays bounded on huge boards.
+
+    Parameters:
+       game (dict): Game state
+       xray (bool): Whether to ignore the mask
+
+    Returns: an iterator over row strings
+    """
+
+    if not is_flat(game):
+        game = flatten_game(game)
+
+    dimensions = game['dimensions']
+    board = game['board']
+    mask = game['mask']
+    width = dimensions[-1]
+    block = width * max(1, 65536 // width)
+
+    for start in range(0, len(board), block):
+        end = start + block
+        chars = render_values(dimensions, board[start:end], mask[start:end], xray)
+        for i in range(0, len(chars), width):
+            yield ''.join(chars[i:i + width])
+
+
+def write_ascii(game, fp, xray=False):
+    """
+    Streams a game as ASCII art to a file-like object, one line per row.
+
+    Parameters:
+       game (dict): Game state
+       fp: file-like object with a write method
+       xray (bool): Whether to ignore the mask
+
+    Returns: nothing
+
+    >>> import sys
+    >>> write_ascii(new_game_nd((2, 3), [(0, 0), (1, 2)]), sys.stdout, True)
+    .21
+    12.
+    """
+
+    if _stats is not None:
+        start = perf_counter()
+
+    for row in iter_ascii_rows(game, xray):
+        fp.write(row + '\n')
+
+    if _stats is not None:
+        _stats.record('render', game['dimensions'], perf_counter() - start,
+                      {'cells_rendered': prod(game['dimensions'])})
+
+
+# GAME OBJECT
+
+class Game(Mapping):
+    """
+    A game stored compactly: the flat board array and mask bytearray of
+    new_game_flat, in a __slots__ object with no per-game dictionary.
+
+    A Game can also be read like the dictionary new_game_nd returns, with
+    the keys 'dimensions', 'state', 'hidden_safe', 'board' and 'mask' (and
+    'flags', 'flag_counts' and 'history' once they are used).  The nested
+    'board' and 'mask' lists are built only when they are first indexed,
+    then kept up to date by digs (release_views drops them); 'flags' and
+    'flag_counts' are converted to nested lists each time.  They are
+    read-only: change a Game through its methods or the module functions
+    (dig_nd, dig_many, dig_delta, flag_nd, chord_nd, take_snapshot, ...),
+    which work on its flat storage.
+
+    >>> g = Game((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> g.dig((0, 3)), g.state()
+    (4, 'ongoing')
+    >>> g.render()
+    [['_', '_', '1', ' '], ['_', '_', '1', ' ']]
+    >>> g['board']
+    [['.', 3, 1, 0], ['.', '.', 1, 0]]
+    >>> dig_nd(g, (0, 1)), g['mask'][0], g['state']
+    (1, [False, True, True, True], 'victory')
+    """
 
-    return render   
+    __slots__ = ('dimensions', 'strides', 'values', 'revealed', 'hidden_safe',
+                 '_state', '_views', 'flags', 'flag_counts', 'history')
+
+    KEYS = ('dimensions', 'board', 'mask', 'hidden_safe', 'state')
+
+    # Keys present once set (see set_flag and take_snapshot)
+    OPTIONAL_KEYS = ('flags', 'flag_counts', 'history')
+
+    def __init__(self, dimensions, bombs):
+        """
+        Starts a new game (see new_game_nd).
+
+        Args:
+           dimensions (tuple): Dimensions of the board
+           bombs (list): Bomb locations, each an N-dimensional coordinate
+        """
+
+        self.load(new_game_flat(dimensions, bombs))
+
+    @classmethod
+    def from_game(cls, game):
+        """
+        Makes a Game from a game state dictionary (nested-list or flat).  A
+        flat game's buffers are shared, not copied.
+
+        Args:
+           game (dict): Game state
+
+        Returns:
+           A Game
+        """
+
+        obj = cls.__new__(cls)
+        obj.load(game if is_flat(game) else flatten_game(game))
+        return obj
+
+    def load(self, flat):
+        """
+        Takes the storage of a flat game.
+        """
+
+        self.dimensions = flat['dimensions']
+        self.strides = flat['strides']
+        self.values = flat['board']
+        self.revealed = flat['mask']
+        self.hidden_safe = flat['hidden_safe']
+        self._state = flat['state']
+        self._views = None
+        for key in self.OPTIONAL_KEYS:
+            setattr(self, key, flat.get(key))
+
+    def as_flat(self):
+        """
+        Gets a flat game state dictionary sharing this game's storage.
+        Changes to its state, hidden safe count, flags and history are
+        copied back by absorb.
+
+        Returns: a flat game state dictionary
+        """
+
+        flat = {
+            'dimensions': self.dimensions,
+            'strides': self.strides,
+            'board': self.values,
+            'mask': self.revealed,
+            'hidden_safe': self.hidden_safe,
+            'state': self._state}
+        for key in self.OPTIONAL_KEYS:
+            value = getattr(self, key)
+            if value is not None:
+                flat[key] = value
+        return flat
+
+    def absorb(self, flat, revealed):
+        """
+        Copies the state of a dictionary from as_flat back into the game,
+        after revealed cells were dug in it.
+
+        Parameters:
+           flat (dict): flat game returned by as_flat
+           revealed (list): offsets revealed in flat
+
+        Returns: nothing
+        """
+
+        self.hidden_safe = flat['hidden_safe']
+        self._state = flat['state']
+        for key in self.OPTIONAL_KEYS:
+            setattr(self, key, flat.get(key))
+        if self._views is not None:
+            mask = self._views[1]
+            for offset in revealed:
+                row = mask
+                cell = offset_to_cell(self.strides, offset)
+                for c in cell[:-1]:
+                    row = row[c]
+                row[cell[-1]] = True
+
+    def dig(self, coordinates):
+        """
+        Digs a square (see dig_nd).
+
+        Args:
+           coordinates (tuple): Where to start digging
+
+        Returns:
+           int: number of squares revealed
+        """
+
+        flat = self.as_flat()
+        revealed = dig_offsets(flat, cell_to_offset(self.strides, coordinates))
+        self.absorb(flat, revealed)
+        return len(revealed)
+
+    def render(self, xray=False):
+        """
+        Renders the game as nested lists (see render_nd).
+        """
+
+        return render_nd(self.as_flat(), xray)
+
+    def render_ascii(self, xray=False):
+        """
+        Renders the game as ASCII art (see render_ascii).
+        """
+
+        return render_ascii(self.as_flat(), xray)
+
+    def state(self):
+        """
+        Gets the state of the game: 'ongoing', 'defeat' or 'victory'.
+        """
+
+        return self._state
+
+    def views(self):
+        """
+        Gets the nested-list board and mask, building them on first use.
+
+        Returns: a tuple (board, mask) of nested lists
+        """
+
+        if self._views is None:
+            nested = unflatten_game(self.as_flat())
+            self._views = (nested['board'], nested['mask'])
+        return self._views
+
+    def release_views(self):
+        """
+        Drops the nested-list board and mask to free their memory.
+        """
+
+        self._views = None
+
+    def __getitem__(self, key):
+        if key == 'dimensions':
+            return self.dimensions
+        if key == 'state':
+            return self._state
+        if key == 'hidden_safe':
+            return self.hidden_safe
+        if key == 'board':
+            return self.views()[0]
+        if key == 'mask':
+            return self.views()[1]
+        if key in self.OPTIONAL_KEYS and getattr(self, key) is not None:
+            if key == 'history':
+                return self.history
+            # Flags are shown as nested lists, like the board and mask
+            return nested_flags(self.as_flat())[key == 'flag_counts']
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from self.KEYS
+        for key in self.OPTIONAL_KEYS:
+            if getattr(self, key) is not None:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'Game(dimensions={self.dimensions!r}, state={self._state!r})'
 
 
 if __name__ == "__main__":
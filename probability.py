@@ -0,0 +1,242 @@
+"""
+Exact bomb probabilities of the hidden cells of a game.
+
+Hidden cells next to a revealed number form the frontier; the others form
+the interior, about which the numbers say nothing.  The frontier is split
+into independent components (cells linked by shared constraints), every
+component is enumerated on its own (results are cached by the component's
+shape), and the components are combined with the interior by weighting each
+total frontier bomb count with the number of ways to place the remaining
+bombs in the interior.
+"""
+
+from fractions import Fraction
+from functools import lru_cache
+from math import comb
+
+from minesweeper import (BOMB, flatten_game, is_flat, neighbor_offsets,
+                         offset_to_cell)
+
+
+def frontier_components(game):
+    """
+    Splits the frontier constraints of a flat game into independent
+    components.
+
+    Parameters:
+       game (dict): Game state (flat)
+
+    Returns: a list of components, each a tuple (cells, constraints) where
+        cells lists the hidden offsets of the component in search order and
+        constraints is a list of (offsets, bombs) pairs
+    """
+
+    dimensions = tuple(game['dimensions'])
+    board = game['board']
+    mask = game['mask']
+
+    constraints = []
+    for o in range(len(mask)):
+        if mask[o] and board[o] > 0:
+            hidden = [n for n in neighbor_offsets(dimensions, o) if not mask[n]]
+            if hidden:
+                constraints.append((hidden, board[o]))
+
+    # Index constraints by cell, then walk them breadth first
+    by_cell = {}
+    for i, (cells, _) in enumerate(constraints):
+        for n in cells:
+            by_cell.setdefault(n, []).append(i)
+
+    components = []
+    seen = set()
+    for start in range(len(constraints)):
+        if start in seen:
+            continue
+        seen.add(start)
+        queue = [start]
+        cells = []
+        placed = set()
+        for i in queue:
+            for n in constraints[i][0]:
+                if n not in placed:
+                    placed.add(n)
+                    cells.append(n)
+                    for j in by_cell[n]:
+                        if j not in seen:
+                            seen.add(j)
+                            queue.append(j)
+        components.append((cells, [constraints[i] for i in queue]))
+
+    return components
+
+
+@lru_cache(maxsize=4096)
+def solve_component(size, constraints):
+    """
+    Counts every bomb placement of a component that satisfies its
+    constraints.  Cells that are in exactly the same constraints are
+    interchangeable, so they are enumerated as a group (how many bombs, with
+    binomial multiplicity) rather than cell by cell.  Cached, so components
+    of the same shape are solved once.
+
+    Parameters:
+       size (int): number of cells, numbered 0 to size - 1 in search order
+       constraints (tuple): (cell numbers, bombs) pairs
+
+    Returns: a tuple of (bombs, solutions, per-cell bomb counts) triples,
+        one per number of bombs that has solutions
+    """
+
+    memberships = [[] for _ in range(size)]
+    for i, (cells, _) in enumerate(constraints):
+        for n in cells:
+            memberships[n].append(i)
+
+    groups = {}
+    for n in range(size):
+        groups.setdefault(tuple(memberships[n]), []).append(n)
+    groups = list(groups.items())
+
+    need = [bombs for _, bombs in constraints]
+    left = [len(cells) for cells, _ in constraints]
+    chosen = [0] * len(groups)
+    results = {}
+
+    def search(g, bombs, ways):
+        if g == len(groups):
+            entry = results.setdefault(bombs, [0, [0] * len(groups)])
+            entry[0] += ways
+            for i in range(len(groups)):
+                entry[1][i] += ways * chosen[i]
+            return
+
+        members, cells = groups[g]
+        for c in members:
+            left[c] -= len(cells)
+        for j in range(len(cells) + 1):
+            if all(0 <= need[c] - j <= left[c] for c in members):
+                for c in members:
+                    need[c] -= j
+                chosen[g] = j
+                search(g + 1, bombs + j, ways * comb(len(cells), j))
+                for c in members:
+                    need[c] += j
+        for c in members:
+            left[c] += len(cells)
+        chosen[g] = 0
+
+    search(0, 0, 1)
+
+    solutions = []
+    for bombs, (count, group_bombs) in sorted(results.items()):
+        cell_bombs = [0] * size
+        for (_, cells), total in zip(groups, group_bombs):
+            for n in cells:
+                cell_bombs[n] = total // len(cells)
+        solutions.append((bombs, count, tuple(cell_bombs)))
+    return tuple(solutions)
+
+
+def convolve(a, b):
+    """
+    Combines two {bombs: ways} distributions of independent parts.
+    """
+
+    total = {}
+    for i, x in a.items():
+        for j, y in b.items():
+            total[i + j] = total.get(i + j, 0) + x * y
+    return total
+
+
+def mine_probabilities(game, exact=False):
+    """
+    Computes the probability that each hidden cell is a bomb, given the
+    revealed numbers and the total number of bombs.
+
+    Args:
+       game (dict): Game state (nested-list or flat)
+       exact (bool): Whether to return Fractions instead of floats
+
+    Returns:
+       A dictionary mapping the coordinates of every hidden cell to its
+       probability of being a bomb
+
+    >>> from minesweeper import new_game_nd, dig_nd
+    >>> g = new_game_nd((3, 4), [(0, 0), (2, 1)])
+    >>> dig_nd(g, (0, 3))
+    8
+    >>> mine_probabilities(g)
+    {(0, 0): 0.5, (1, 0): 0.5, (2, 0): 0.0, (2, 1): 1.0}
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_nd(g, (0, 3))
+    4
+    >>> mine_probabilities(g, exact=True)[(0, 1)]
+    Fraction(1, 2)
+    """
+
+    if not is_flat(game):
+        game = flatten_game(game)
+
+    board = game['board']
+    mask = game['mask']
+    bombs = sum(1 for v, m in zip(board, mask) if v == BOMB and not m)
+    hidden = [o for o in range(len(mask)) if not mask[o]]
+
+    # Solve every component, relabeling its cells 0..size-1 for the cache
+    solved = []
+    frontier = set()
+    for cells, constraints in frontier_components(game):
+        local = {n: i for i, n in enumerate(cells)}
+        shape = tuple((tuple(local[n] for n in c), b) for c, b in constraints)
+        solved.append((cells, solve_component(len(cells), shape)))
+        frontier.update(cells)
+
+    interior = len(hidden) - len(frontier)
+    ways = [{b: count for b, count, _ in result} for _, result in solved]
+
+    # prefix[i] combines components before i, suffix[i] those from i on
+    prefix = [{0: 1}]
+    for w in ways:
+        prefix.append(convolve(prefix[-1], w))
+    suffix = [{0: 1}]
+    for w in reversed(ways):
+        suffix.append(convolve(suffix[-1], w))
+    suffix.reverse()
+
+    def interior_ways(k):
+        return comb(interior, bombs - k) if 0 <= bombs - k <= interior else 0
+
+    total = 0
+    interior_bombs = 0
+    for k, count in prefix[-1].items():
+        total += count * interior_ways(k)
+        interior_bombs += count * interior_ways(k) * (bombs - k)
+    if total == 0:
+        raise ValueError('the revealed numbers are inconsistent')
+
+    numerators = {}
+    for i, (cells, result) in enumerate(solved):
+        others = convolve(prefix[i], suffix[i + 1])
+        cell_ways = [0] * len(cells)
+        for b, _, cell_bombs in result:
+            weight = sum(count * interior_ways(b + k) for k, count in others.items())
+            for n in range(len(cells)):
+                cell_ways[n] += cell_bombs[n] * weight
+        for n, o in enumerate(cells):
+            numerators[o] = cell_ways[n]
+
+    # Every interior cell has the same probability
+    if interior:
+        interior_p = Fraction(interior_bombs, interior * total)
+
+    strides = game['strides']
+    probabilities = {}
+    for o in hidden:
+        if o in numerators:
+            p = Fraction(numerators[o], total) if exact else numerators[o] / total
+        else:
+            p = interior_p if exact else float(interior_p)
+        probabilities[offset_to_cell(strides, o)] = p
+    return probabilities
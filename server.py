@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Asyncio game server: hosts many games in memory and takes newline-delimited
+JSON commands over TCP or a Unix socket.
+
+Every request is one JSON object per line, with a 'cmd' and an optional
+'id' that is echoed in the reply:
+
+   {"cmd": "new", "dimensions": [16, 16], "bombs": [[0, 1], ...]}
+   {"cmd": "new", "dimensions": [16, 16], "num_bombs": 40, "seed": 7}
+        -> {"ok": true, "session": 1}
+   {"cmd": "dig", "session": 1, "cell": [3, 4]}
+        -> {"ok": true, "cells": [[[3, 4], "1"], ...], "state": "ongoing"}
+   {"cmd": "render", "session": 1, "xray": false}
+        -> {"ok": true, "board": [["_", "1", ...], ...], "state": "ongoing"}
+   {"cmd": "close", "session": 1}
+        -> {"ok": true}
+
+Failed requests get {"ok": false, "error": "..."}.  Digs reply with the
+revealed cells only (see minesweeper.dig_delta).  Digs that may flood fill
+and renders of large boards run in an executor so they do not stall the
+event loop; a dig is weighed by the board's cells times the 3 ** N
+neighbours of a cell, and boards have at most max_dimensions axes.  Sessions
+idle for longer than idle_timeout are closed, and the total number of board
+cells in memory is bounded by max_cells (the least recently used sessions
+idle for at least min_idle seconds are closed to make room, and new games
+are refused when there are none).
+
+    python server.py --port 8765
+    python server.py --unix /tmp/minesweeper.sock
+"""
+
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+from itertools import count
+from math import prod
+
+from minesweeper import (cell_to_offset, dig_delta, new_game_flat,
+                         random_game_flat, render_nd)
+
+
+class Session:
+    """
+    A game hosted by the server.
+    """
+
+    def __init__(self, game, now):
+        self.game = game
+        self.cells = len(game['board'])
+        self.dig_cost = dig_cost(game['dimensions'])
+        self.lock = asyncio.Lock()
+        self.last_used = now
+
+
+class GameServer:
+    """
+    Holds the sessions and answers requests.
+
+    >>> server = GameServer()
+    >>> def ask(**request):
+    ...     return asyncio.run(server.handle(request))
+    >>> ask(cmd='new', dimensions=[2, 4], bombs=[[0, 0], [1, 0], [1, 1]], id=7)
+    {'id': 7, 'session': 1, 'ok': True}
+    >>> ask(cmd='dig', session=1, cell=[0, 3])
+    {'cells': [[[0, 3], ' '], [[0, 2], '1'], [[1, 2], '1'], [[1, 3], ' ']],
+     'state': 'ongoing', 'ok': True}
+    >>> ask(cmd='render', session=1)
+    {'board': [['_', '_', '1', ' '], ['_', '_', '1', ' ']], 'state': 'ongoing', 'ok': True}
+    >>> ask(cmd='dig', session=1, cell=[0, 9])
+    {'ok': False, 'error': 'cell [0, 9] is not on the board'}
+    >>> ask(cmd='fly')
+    {'ok': False, 'error': 'unknown command'}
+    >>> ask(cmd='close', session=1), server.cells
+    ({'ok': True}, 0)
+    >>> ask(cmd='render', session=1)
+    {'ok': False, 'error': 'no session 1'}
+    >>> ask(cmd='new', dimensions=[1] * 13, num_bombs=0)
+    {'ok': False, 'error': 'boards have at most 8 dimensions'}
+    """
+
+    def __init__(self, idle_timeout=600, max_cells=10 ** 8, offload_cells=4096,
+                 executor=None, max_dimensions=8, min_idle=60):
+        """
+        Parameters:
+           idle_timeout (float): seconds after which an unused session is closed
+           max_cells (int): most board cells held across all sessions
+           offload_cells (int): boards with at least this many cells are
+                                rendered in the executor, and digs that may
+                                flood fill are run there when the board's
+                                cells times 3 ** N reach it
+           executor: concurrent.futures executor for large digs and renders
+                     (the event loop's default executor by default)
+           max_dimensions (int): most axes of a board
+           min_idle (float): seconds a session must have been unused before
+                             it is closed to make room for a new one
+        """
+
+        self.idle_timeout = idle_timeout
+        self.max_cells = max_cells
+        self.offload_cells = offload_cells
+        self.executor = executor
+        self.max_dimensions = max_dimensions
+        self.min_idle = min_idle
+        self.sessions = OrderedDict()  # id -> Session, least recently used first
+        self.cells = 0
+        self.ids = count(1)
+
+    def session(self, request):
+        """
+        Gets the session of a request and marks it as used.
+        """
+
+        session_id = request.get('session')
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError(f'no session {session_id}')
+        self.sessions.move_to_end(session_id)
+        session.last_used = asyncio.get_running_loop().time()
+        return session
+
+    def close(self, session_id):
+        """
+        Drops a session.
+        """
+
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.cells -= session.cells
+
+    def make_room(self, cells):
+        """
+        Closes least recently used sessions that have been idle for at least
+        min_idle seconds until cells more cells fit under max_cells.  Raises
+        ValueError if they do not.
+
+        Returns: nothing
+
+        >>> server = GameServer(max_cells=10)
+        >>> def new(cells):
+        ...     request = {'cmd': 'new', 'dimensions': [cells], 'num_bombs': 1}
+        ...     return asyncio.run(server.handle(request))
+        >>> new(8), new(4), list(server.sessions), server.cells
+        ({'session': 1, 'ok': True}, {'ok': False, 'error': 'server is full'}, [1], 8)
+        >>> server.min_idle = 0
+        >>> new(4), list(server.sessions), server.cells
+        ({'session': 2, 'ok': True}, [2], 4)
+        >>> new(20)
+        {'ok': False, 'error': 'board of 20 cells is larger than the server limit'}
+        """
+
+        if cells > self.max_cells:
+            raise ValueError(f'board of {cells} cells is larger than the server limit')
+
+        # Sessions are in order of last use, so the idle ones come first
+        deadline = asyncio.get_running_loop().time() - self.min_idle
+        for session_id, session in list(self.sessions.items()):
+            if self.cells + cells <= self.max_cells or session.last_used > deadline:
+                break
+            if not session.lock.locked():
+                self.close(session_id)
+
+        if self.cells + cells > self.max_cells:
+            raise ValueError('server is full')
+
+    def evict_idle(self):
+        """
+        Closes the sessions that have not been used for idle_timeout seconds.
+
+        Returns: the number of sessions closed
+
+        >>> server = GameServer(idle_timeout=0)
+        >>> async def new_then_evict():
+        ...     await server.handle({'cmd': 'new', 'dimensions': [4], 'num_bombs': 1})
+        ...     return server.evict_idle()
+        >>> asyncio.run(new_then_evict()), len(server.sessions), server.cells
+        (1, 0, 0)
+        """
+
+        deadline = asyncio.get_running_loop().time() - self.idle_timeout
+        idle = [session_id for session_id, session in self.sessions.items()
+                if session.last_used < deadline and not session.lock.locked()]
+        for session_id in idle:
+            self.close(session_id)
+        return len(idle)
+
+    async def run_large(self, cost, function, *args):
+        """
+        Runs function(*args) in the executor if its cost (board cells, or
+        dig_cost for digs) reaches offload_cells, inline otherwise.
+        """
+
+        if cost < self.offload_cells:
+            return function(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def new(self, request):
+        dimensions = tuple(request['dimensions'])
+        if not dimensions or not all(isinstance(d, int) and d > 0 for d in dimensions):
+            raise ValueError('dimensions must be positive integers')
+        if len(dimensions) > self.max_dimensions:
+            raise ValueError(f'boards have at most {self.max_dimensions} dimensions')
+
+        cells = prod(dimensions)
+        self.make_room(cells)
+
+        # Building a board counts the bombs around every cell
+        cost = dig_cost(dimensions)
+        if 'bombs' in request:
+            bombs = [check_cell(dimensions, b) for b in request['bombs']]
+            game = await self.run_large(cost, new_game_flat, dimensions, bombs)
+        else:
+            num_bombs = request['num_bombs']
+            if not 0 <= num_bombs <= cells:
+                raise ValueError('num_bombs must be between 0 and the number of cells')
+            game = await self.run_large(cost, random_game_flat, dimensions,
+                                        num_bombs, request.get('seed'))
+
+        # Room may have been taken while the board was built
+        self.make_room(cells)
+        session_id = next(self.ids)
+        self.sessions[session_id] = Session(game, asyncio.get_running_loop().time())
+        self.cells += cells
+        return {'session': session_id}
+
+    async def dig(self, request):
+        session = self.session(request)
+        game = session.game
+        cell = check_cell(game['dimensions'], request['cell'])
+
+        async with session.lock:
+            # Only a hidden 0 starts a flood fill
+            offset = cell_to_offset(game['strides'], cell)
+            cost = session.dig_cost if game['board'][offset] == 0 else 0
+            delta = await self.run_large(cost, dig_delta, game, cell)
+
+        return {
+            'cells': [[list(c), char] for c, char in delta['cells']],
+            'state': delta['state']}
+
+    async def render(self, request):
+        session = self.session(request)
+        async with session.lock:
+            board = await self.run_large(session.cells, render_nd, session.game,
+                                         bool(request.get('xray', False)))
+        return {'board': board, 'state': session.game['state']}
+
+    async def close_session(self, request):
+        session = self.session(request)
+        async with session.lock:
+            self.close(request['session'])
+        return {}
+
+    async def handle(self, request):
+        """
+        Answers one request.
+
+        Parameters:
+           request (dict): decoded JSON request
+
+        Returns: the reply dictionary
+        """
+
+        commands = {
+            'new': self.new,
+            'dig': self.dig,
+            'render': self.render,
+            'close': self.close_session}
+
+        reply = {}
+        if isinstance(request, dict) and 'id' in request:
+            reply['id'] = request['id']
+        try:
+            if not isinstance(request, dict) or request.get('cmd') not in commands:
+                raise ValueError('unknown command')
+            reply.update(await commands[request['cmd']](request))
+            reply['ok'] = True
+        except (KeyError, ValueError, TypeError) as e:
+            reply['ok'] = False
+            reply['error'] = str(e.args[0]) if e.args else type(e).__name__
+        return reply
+
+    async def serve_client(self, reader, writer):
+        """
+        Answers the requests of one connection, in order.
+        """
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    reply = {'ok': False, 'error': 'invalid JSON'}
+                else:
+                    reply = await self.handle(request)
+                writer.write(json.dumps(reply, separators=(',', ':')).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def evict_forever(self):
+        """
+        Evicts idle sessions periodically.
+        """
+
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 2, 0.1))
+            self.evict_idle()
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None, limit=2 ** 24):
+        """
+        Listens on a TCP port, or on a Unix socket if path is given, until
+        cancelled.
+
+        Parameters:
+           host (str): TCP host
+           port (int): TCP port
+           path (str): Unix socket path
+           limit (int): longest request line, in bytes
+        """
+
+        if path is not None:
+            server = await asyncio.start_unix_server(self.serve_client, path, limit=limit)
+        else:
+            server = await asyncio.start_server(self.serve_client, host, port, limit=limit)
+
+        eviction = asyncio.create_task(self.evict_forever())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            eviction.cancel()
+
+
+def dig_cost(dimensions):
+    """
+    Weighs a flood fill of a whole board: its cells times the 3 ** N cells
+    of the neighbourhood each of them is checked against.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+
+    Returns: the cost, in neighbour visits
+
+    >>> dig_cost((16, 16)), dig_cost((1,) * 8)
+    (2304, 6561)
+    """
+
+    return prod(dimensions) * 3 ** len(dimensions)
+
+
+def check_cell(dimensions, cell):
+    """
+    Checks that a cell from a request is on the board.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       cell (list): cell coordinates
+
+    Returns: the coordinates as a tuple
+    """
+
+    cell = tuple(cell)
+    if len(cell) != len(dimensions) or not all(
+            isinstance(c, int) and 0 <= c < d for c, d in zip(cell, dimensions)):
+        raise ValueError(f'cell {list(cell)} is not on the board')
+    return cell
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--idle-timeout', type=float, default=600)
+    parser.add_argument('--max-cells', type=int, default=10 ** 8)
+    parser.add_argument('--offload-cells', type=int, default=4096)
+    parser.add_argument('--max-dimensions', type=int, default=8)
+    parser.add_argument('--min-idle', type=float, default=60)
+    args = parser.parse_args(argv)
+
+    server = GameServer(args.idle_timeout, args.max_cells, args.offload_cells,
+                        max_dimensions=args.max_dimensions, min_idle=args.min_idle)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
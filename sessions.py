@@ -0,0 +1,166 @@
+"""
+Thread-safe registry of games for threaded servers.
+
+dig_nd changes a game in place, so two threads digging the same game at
+once could both reveal a cell or miss a victory.  The registry serializes
+the operations on each game with a lock, without a global lock: games are
+spread over a fixed pool of locks by session id, so games on different
+locks are dug in parallel (and at most num_locks locks exist however many
+games are hosted).  Each lock keeps contention metrics.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from itertools import count
+
+from minesweeper import dig_delta, dig_nd, new_game_flat, render_nd
+
+
+class SessionRegistry:
+    """
+    Games by session id, with sharded locking.
+    """
+
+    def __init__(self, num_locks=64):
+        """
+        Parameters:
+           num_locks (int): size of the lock pool
+        """
+
+        self.locks = [threading.Lock() for _ in range(num_locks)]
+        # Per lock: [acquisitions, contended acquisitions, seconds waited]
+        self.lock_stats = [[0, 0, 0.0] for _ in range(num_locks)]
+        self.games = {}
+        self.ids = count(1)
+
+    @contextmanager
+    def locked(self, session_id):
+        """
+        Holds the lock of a session while the with block runs, and yields its
+        game.
+
+        Parameters:
+           session_id (int): session id
+
+        >>> registry = SessionRegistry(4)
+        >>> s = registry.create((2, 4), [(0, 0), (1, 0), (1, 1)])
+        >>> with registry.locked(s) as game:
+        ...     game['state']
+        'ongoing'
+        """
+
+        shard = hash(session_id) % len(self.locks)
+        lock = self.locks[shard]
+
+        if lock.acquire(blocking=False):
+            waited = None
+        else:
+            start = time.perf_counter()
+            lock.acquire()
+            waited = time.perf_counter() - start
+
+        try:
+            stats = self.lock_stats[shard]
+            stats[0] += 1
+            if waited is not None:
+                stats[1] += 1
+                stats[2] += waited
+
+            game = self.games.get(session_id)
+            if game is None:
+                raise KeyError(f'no session {session_id}')
+            yield game
+        finally:
+            lock.release()
+
+    def add(self, game):
+        """
+        Registers a game (nested-list or flat).
+
+        Parameters:
+           game (dict): Game state
+
+        Returns: the new session id
+        """
+
+        session_id = next(self.ids)
+        self.games[session_id] = game
+        return session_id
+
+    def create(self, dimensions, bombs):
+        """
+        Starts a new flat game (see minesweeper.new_game_flat) and registers
+        it.  Flat games are dug in O(cells revealed), so a dig holds its lock
+        no longer than it has to.
+
+        Returns: the new session id
+
+        >>> registry = SessionRegistry(4)
+        >>> s = registry.create((2, 4), [(0, 0), (1, 0), (1, 1)])
+        >>> registry.dig(s, (0, 3)), registry.render(s)
+        (4, [['_', '_', '1', ' '], ['_', '_', '1', ' ']])
+        """
+
+        return self.add(new_game_flat(dimensions, bombs))
+
+    def close(self, session_id):
+        """
+        Removes a game, once no operation on it is running.
+
+        Returns: the game
+        """
+
+        with self.locked(session_id):
+            return self.games.pop(session_id)
+
+    def dig(self, session_id, coordinates):
+        """
+        Digs a game (see minesweeper.dig_nd).
+
+        Returns: the number of squares revealed
+
+        >>> registry = SessionRegistry(4)
+        >>> s = registry.create((2, 4), [(0, 0), (1, 0), (1, 1)])
+        >>> registry.dig(s, (0, 3)), registry.dig(s, (0, 3))
+        (4, 0)
+        >>> registry.metrics()['acquisitions']
+        2
+        """
+
+        with self.locked(session_id) as game:
+            return dig_nd(game, coordinates)
+
+    def dig_delta(self, session_id, coordinates):
+        """
+        Digs a game and describes the change (see minesweeper.dig_delta).
+        """
+
+        with self.locked(session_id) as game:
+            return dig_delta(game, coordinates)
+
+    def render(self, session_id, xray=False):
+        """
+        Renders a game (see minesweeper.render_nd).
+        """
+
+        with self.locked(session_id) as game:
+            return render_nd(game, xray)
+
+    def metrics(self):
+        """
+        Gets the lock contention metrics.
+
+        Returns: a dictionary with the totals 'acquisitions', 'contended'
+            (acquisitions that had to wait) and 'wait_seconds', the
+            'sessions' count, and 'locks', the [acquisitions, contended,
+            wait seconds] of each lock of the pool
+        """
+
+        stats = [list(s) for s in self.lock_stats]
+        return {
+            'acquisitions': sum(s[0] for s in stats),
+            'contended': sum(s[1] for s in stats),
+            'wait_seconds': sum(s[2] for s in stats),
+            'sessions': len(self.games),
+            'locks': stats}
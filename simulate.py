@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Plays many seeded games over a process pool and reports statistics.
+
+Game i of a run with seed s is generated and played from its own random
+generator seeded with (s, i), so results do not depend on how the games are
+split between processes.
+
+    python simulate.py --dimensions 16 16 --density 0.15 --games 10000
+"""
+
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress
+from math import prod
+
+from minesweeper import dig_nd, offset_to_cell, random_game_flat
+
+# Maps a mask byte to 1 if the cell is hidden
+HIDDEN = bytes([1] + [0] * 255)
+
+
+def random_policy(game, rng):
+    """
+    Picks a random hidden cell, uniformly among the hidden offsets.
+
+    Parameters:
+       game (dict): Game state (flat)
+       rng (random.Random): random generator of the game
+
+    Returns: coordinates of the cell to dig
+    """
+
+    mask = game['mask']
+    hidden = list(compress(range(len(mask)), bytes(mask).translate(HIDDEN)))
+    return offset_to_cell(game['strides'], rng.choice(hidden))
+
+
+def play_game(dimensions, num_bombs, seed, index, policy=random_policy):
+    """
+    Generates and plays game number index of a run until it ends.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       num_bombs (int): number of bombs
+       seed (int): seed of the run
+       index (int): index of the game in the run
+       policy: function (game, rng) -> coordinates picking the next dig
+
+    Returns: a dictionary with 'index', 'won', 'moves', 'revealed' and
+        'seconds' (time spent digging)
+    """
+
+    rng = random.Random(f'{seed}-{index}')
+    game = random_game_flat(dimensions, num_bombs, rng.getrandbits(64))
+
+    moves = 0
+    revealed = 0
+    seconds = 0.0
+    while game['state'] == 'ongoing':
+        coordinates = policy(game, rng)
+        start = time.perf_counter()
+        revealed += dig_nd(game, coordinates)
+        seconds += time.perf_counter() - start
+        moves += 1
+
+    return {
+        'index': index,
+        'won': game['state'] == 'victory',
+        'moves': moves,
+        'revealed': revealed,
+        'seconds': seconds}
+
+
+def play_shard(task):
+    """
+    Plays a range of games of a run (the unit of work of a process).
+
+    Parameters:
+       task (tuple): (dimensions, num_bombs, seed, start, stop, policy)
+
+    Returns: a list of play_game results
+    """
+
+    dimensions, num_bombs, seed, start, stop, policy = task
+    return [play_game(dimensions, num_bombs, seed, i, policy)
+            for i in range(start, stop)]
+
+
+def iter_results(dimensions, density, games, seed=0, policy=random_policy,
+                 workers=None, shard_size=100):
+    """
+    Plays games and yields their results as the shards finish.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+       density (float): fraction of the cells that are bombs
+       games (int): number of games
+       seed (int): seed of the run
+       policy: picklable function (game, rng) -> coordinates
+       workers (int): number of processes (1 plays in this process, None
+                      uses every core)
+       shard_size (int): number of games sent to a process at a time
+
+    Returns: an iterator over play_game results, in game order
+
+    The same seed plays the same games however they are sharded:
+
+    >>> results = list(iter_results((8, 8), 0.1, 20, seed=3, workers=1))
+    >>> def outcomes(results):
+    ...     return [(r['index'], r['won'], r['moves'], r['revealed']) for r in results]
+    >>> outcomes(results)[:3]
+    [(0, False, 4, 52), (1, False, 2, 48), (2, False, 8, 45)]
+    >>> outcomes(results) == outcomes(
+    ...     iter_results((8, 8), 0.1, 20, seed=3, workers=1, shard_size=7))
+    True
+    >>> summary = summarize(results)
+    >>> summary['games'], summary['wins'], summary['moves'], summary['win_rate']
+    (20, 1, 87, 0.05)
+    """
+
+    dimensions = tuple(dimensions)
+    num_bombs = round(density * prod(dimensions))
+    tasks = [(dimensions, num_bombs, seed, start, min(start + shard_size, games), policy)
+             for start in range(0, games, shard_size)]
+
+    if workers == 1:
+        for task in tasks:
+            yield from play_shard(task)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        for results in executor.map(play_shard, tasks):
+            yield from results
+
+
+def summarize(results):
+    """
+    Aggregates play_game results.
+
+    Parameters:
+       results (iterable): play_game results
+
+    Returns: a dictionary with 'games', 'wins', 'win_rate', 'moves',
+        'reveals_per_move' and 'seconds_per_move'
+    """
+
+    games = wins = moves = revealed = 0
+    seconds = 0.0
+    for r in results:
+        games += 1
+        wins += r['won']
+        moves += r['moves']
+        revealed += r['revealed']
+        seconds += r['seconds']
+
+    return {
+        'games': games,
+        'wins': wins,
+        'win_rate': wins / games if games else 0.0,
+        'moves': moves,
+        'reveals_per_move': revealed / moves if moves else 0.0,
+        'seconds_per_move': seconds / moves if moves else 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dimensions', type=int, nargs='+', required=True)
+    parser.add_argument('--density', type=float, required=True)
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--shard-size', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    results = iter_results(args.dimensions, args.density, args.games, args.seed,
+                           workers=args.workers, shard_size=args.shard_size)
+    print(json.dumps(summarize(results), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Incremental constraint-propagation solver for hints and auto-play.
+
+Every revealed number is a constraint on its hidden neighbors: exactly
+'remaining' of the 'unknown' cells are bombs.  The solver keeps the set of
+frontier constraints and, after each dig, only adds the constraints of the
+newly revealed cells and re-checks the constraints they touch.
+"""
+
+from minesweeper import (BOMB, cell_to_offset, dig_offsets, flatten_game, is_flat,
+                         neighbor_offsets, offset_to_cell, update_nested_game)
+
+
+class HintSolver:
+    """
+    Finds cells that are certainly safe or certainly bombs, using the
+    single-constraint rules (no bombs left / all unknowns are bombs) and the
+    subset rule between overlapping constraints.
+    """
+
+    def __init__(self, game):
+        """
+        Parameters:
+           game (dict): Game state (nested-list or flat); a nested game is
+                        copied to a flat one once, which is solved and dug
+        """
+
+        self.source = game
+        self.game = game if is_flat(game) else flatten_game(game)
+        self.dimensions = tuple(self.game['dimensions'])
+
+        self.mines = set()
+        self.safe = set()
+        self.constraints = {}  # revealed offset -> [unknown offsets, remaining]
+        self.watchers = {}  # hidden offset -> offsets of constraints on it
+
+        mask = self.game['mask']
+        self.update([o for o in range(len(mask)) if mask[o]])
+
+    def update(self, revealed):
+        """
+        Adds newly revealed cells to the solver and propagates.
+
+        Parameters:
+           revealed (list): offsets of the newly revealed cells, as returned
+                            by minesweeper.dig_offsets
+
+        Returns: nothing
+        """
+
+        board = self.game['board']
+        mask = self.game['mask']
+        queue = []
+
+        for o in revealed:
+            mask[o] = 1
+            self.safe.discard(o)
+            self.resolve(o, board[o] == BOMB, queue)
+
+        for o in revealed:
+            self.add_constraint(o, queue)
+
+        self.propagate(queue)
+
+    def dig(self, coordinates):
+        """
+        Digs the solver's game (see minesweeper.dig_nd) and updates the
+        solver with the revealed cells.  The flat game is dug, and only the
+        revealed cells are copied to a nested source game.
+
+        Parameters:
+           coordinates (tuple): Where to dig
+
+        Returns: the number of squares revealed
+
+        >>> from minesweeper import new_game_nd, render_nd
+        >>> g = new_game_nd((3, 4), [(0, 0), (2, 1)])
+        >>> solver = HintSolver(g)
+        >>> solver.dig((0, 3)), solver.safe_cells(), g['hidden_safe']
+        (8, [(2, 0)], 2)
+        >>> solver.dig((2, 0)), render_nd(g)[2], g['hidden_safe']
+        (1, ['1', '_', '1', ' '], 1)
+        """
+
+        revealed = dig_offsets(self.game, cell_to_offset(self.game['strides'], coordinates))
+        if self.game is not self.source:
+            update_nested_game(self.source, self.game, revealed)
+        self.update(revealed)
+        return len(revealed)
+
+    def safe_cells(self):
+        """
+        Returns: a sorted list with the coordinates of hidden cells that are
+            certainly safe
+        """
+
+        return sorted(offset_to_cell(self.game['strides'], o) for o in self.safe)
+
+    def mine_cells(self):
+        """
+        Returns: a sorted list with the coordinates of hidden cells that are
+            certainly bombs
+        """
+
+        return sorted(offset_to_cell(self.game['strides'], o) for o in self.mines)
+
+    def add_constraint(self, offset, queue):
+        """
+        Adds the constraint of a revealed number to the frontier.
+        """
+
+        value = self.game['board'][offset]
+        if value <= 0:
+            return
+
+        mask = self.game['mask']
+        unknowns = set()
+        remaining = value
+        for n in neighbor_offsets(self.dimensions, offset):
+            if n in self.mines:
+                remaining -= 1
+            elif not mask[n] and n not in self.safe:
+                unknowns.add(n)
+
+        if not unknowns:
+            return
+
+        self.constraints[offset] = [unknowns, remaining]
+        for n in unknowns:
+            self.watchers.setdefault(n, set()).add(offset)
+        queue.append(offset)
+
+    def resolve(self, offset, is_bomb, queue):
+        """
+        Removes a cell whose content is known from every constraint on it,
+        and queues those constraints to be checked again.
+        """
+
+        for c in self.watchers.pop(offset, ()):
+            entry = self.constraints[c]
+            entry[0].discard(offset)
+            if is_bomb:
+                entry[1] -= 1
+            queue.append(c)
+
+    def mark(self, cells, is_bomb, queue):
+        """
+        Records cells as certainly bombs (or certainly safe).
+        """
+
+        for n in cells:
+            if n in self.mines or n in self.safe:
+                continue
+            (self.mines if is_bomb else self.safe).add(n)
+            self.resolve(n, is_bomb, queue)
+
+    def propagate(self, queue):
+        """
+        Checks queued constraints until no new cell can be deduced.
+        """
+
+        while queue:
+            c = queue.pop()
+            entry = self.constraints.get(c)
+            if entry is None:
+                continue
+
+            unknowns, remaining = entry
+            if not unknowns:
+                del self.constraints[c]
+            elif remaining == 0:
+                self.mark(list(unknowns), False, queue)
+            elif remaining == len(unknowns):
+                self.mark(list(unknowns), True, queue)
+            else:
+                self.check_subsets(c, unknowns, remaining, queue)
+
+    def check_subsets(self, c, unknowns, remaining, queue):
+        """
+        Applies the subset rule between constraint c and every constraint
+        sharing a cell with it: if one's unknowns are inside the other's, the
+        difference holds the difference of their bomb counts.
+        """
+
+        others = set()
+        for n in unknowns:
+            others |= self.watchers.get(n, set())
+        others.discard(c)
+
+        for other in others:
+            other_unknowns, other_remaining = self.constraints[other]
+            if unknowns < other_unknowns:
+                rest = other_unknowns - unknowns
+                bombs = other_remaining - remaining
+            elif other_unknowns < unknowns:
+                rest = unknowns - other_unknowns
+                bombs = remaining - other_remaining
+            else:
+                continue
+
+            if bombs == 0 or bombs == len(rest):
+                self.mark(rest, bombs > 0, queue)
+                # Both constraints changed; check them again from scratch
+                queue.append(c)
+                queue.append(other)
+                return
+
+
+def find_hints(game):
+    """
+    Finds the cells of a game that are certainly safe or certainly bombs.
+
+    Args:
+       game (dict): Game state
+
+    Returns:
+       A dictionary with sorted coordinate lists 'safe' and 'mines'
+
+    >>> from minesweeper import new_game_nd, dig_nd, render_nd
+    >>> g = new_game_nd((3, 4), [(0, 0), (2, 1)])
+    >>> dig_nd(g, (0, 3))
+    8
+    >>> render_nd(g)
+    [['_', '1', ' ', ' '], ['_', '2', '1', ' '], ['_', '_', '1', ' ']]
+    >>> find_hints(g)
+    {'safe': [(2, 0)], 'mines': [(2, 1)]}
+    """
+
+    solver = HintSolver(game)
+    return {'safe': solver.safe_cells(), 'mines': solver.mine_cells()}
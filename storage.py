@@ -0,0 +1,439 @@
+"""
+Compact binary format for game states.
+
+A saved game is a fixed header followed by the board and the mask:
+
+   header   magic b'MSWP', format version, state, N, flags, then the N
+            dimensions and the number of hidden safe cells (little-endian)
+   board    one neighbor count per cell in row-major order: 4 bits per cell
+            (high nibble first, bomb = 15) for boards of up to 2 dimensions,
+            otherwise the width of the game's board array (bomb = -1)
+   mask     one bit per cell, least significant bit first
+   flags    only if the FLAGGED flag is set: the flagged cells (see
+            minesweeper.flag_nd), one bit per cell like the mask
+
+Memory-mapped games (create_mapped_game / open_mapped_game) use the same
+header with the MAPPED flag, then the board in the native byte order and
+width of the game's board array, and one byte per cell for the mask, so a
+dig only touches the pages of the cells it reveals.  Their state and hidden
+safe count are written to the header as they change, so the file stays
+consistent if the process stops without closing the game.  Their flags are
+only kept in memory.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from math import prod
+
+from minesweeper import (BOMB, board_typecode, cell_to_offset, flatten_game,
+                         get_strides, is_flat, neighbor_offsets, set_flag,
+                         unflatten_game)
+
+
+MAGIC = b'MSWP'
+VERSION = 2
+# Versions that can be read (version 1 has no FLAGGED flag)
+VERSIONS = (1, 2)
+STATES = ('ongoing', 'defeat', 'victory')
+
+# magic, version, state, N, flags
+HEADER = struct.Struct('<4sBBBB')
+DIMENSIONS_ARE_LIST = 1
+MAPPED = 2
+BIG_ENDIAN = 4
+FLAGGED = 8
+
+NIBBLE_BOMB = 15
+
+# Maps nibble codes to hex digits and back
+TO_HEX = bytes.maketrans(bytes(range(16)), b'0123456789abcdef')
+FROM_HEX = bytes.maketrans(b'0123456789abcdef', bytes(range(16)))
+
+
+def is_nibble_packed(dimensions):
+    """
+    Checks if a board's counts are saved in 4 bits (max count 3^N - 1 < 15).
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+
+    Returns: True or False
+    """
+
+    return 3 ** len(dimensions) - 1 < NIBBLE_BOMB
+
+
+def pack_bits(mask):
+    """
+    Packs 0/1 mask values into bits, least significant bit first.
+
+    Parameters:
+       mask (bytearray): mask values
+
+    Returns: bytes of length ceil(len(mask) / 8)
+    """
+
+    digits = bytes(mask).translate(TO_HEX)[::-1]
+    value = int(digits or b'0', 2)
+    return value.to_bytes((len(mask) + 7) // 8, 'little')
+
+
+def unpack_bits(data, size):
+    """
+    Unpacks pack_bits output.
+
+    Parameters:
+       data (bytes): packed mask
+       size (int): number of cells
+
+    Returns: a bytearray of 0/1 mask values
+    """
+
+    digits = format(int.from_bytes(data, 'little'), f'0{size}b')[::-1]
+    return bytearray(digits.encode().translate(FROM_HEX)[:size])
+
+
+def encode_board(board, dimensions):
+    """
+    Encodes a flat board (see the module docstring).
+
+    Parameters:
+       board (array): flat board values
+       dimensions (tuple): dimensions of the board
+
+    Returns: bytes
+    """
+
+    typecode = board_typecode(dimensions)
+    if not isinstance(board, array) or board.typecode != typecode:
+        board = array(typecode, board)
+
+    if is_nibble_packed(dimensions):
+        codes = board.tobytes().translate(bytes.maketrans(b'\xff', bytes([NIBBLE_BOMB])))
+        digits = codes.translate(TO_HEX)
+        if len(digits) % 2:
+            digits += b'0'
+        return bytes.fromhex(digits.decode())
+
+    if sys.byteorder == 'big':
+        board = array(typecode, board)
+        board.byteswap()
+    return board.tobytes()
+
+
+def decode_board(data, dimensions):
+    """
+    Decodes encode_board output.
+
+    Parameters:
+       data (bytes): encoded board
+       dimensions (tuple): dimensions of the board
+
+    Returns: a flat board array
+    """
+
+    typecode = board_typecode(dimensions)
+
+    if is_nibble_packed(dimensions):
+        codes = data.hex().encode()[:prod(dimensions)].translate(FROM_HEX)
+        codes = codes.translate(bytes.maketrans(bytes([NIBBLE_BOMB]), b'\xff'))
+        return array(typecode, codes)
+
+    board = array(typecode, data)
+    if sys.byteorder == 'big':
+        board.byteswap()
+    return board
+
+
+def board_size(dimensions):
+    """
+    Gets the size of an encoded board.
+
+    Parameters:
+       dimensions (tuple): dimensions of the board
+
+    Returns: a number of bytes
+    """
+
+    cells = prod(dimensions)
+    if is_nibble_packed(dimensions):
+        return (cells + 1) // 2
+    return cells * array(board_typecode(dimensions)).itemsize
+
+
+def encode_game(game):
+    """
+    Encodes a game (nested-list or flat) in the binary format.
+
+    Args:
+       game (dict): Game state
+
+    Returns:
+       bytes
+    """
+
+    flat = game if is_flat(game) else flatten_game(game)
+    dimensions = flat['dimensions']
+    flags = DIMENSIONS_ARE_LIST if isinstance(dimensions, list) else 0
+    parts = [encode_board(flat['board'], dimensions), pack_bits(flat['mask'])]
+    if any(flat.get('flags', ())):
+        flags |= FLAGGED
+        parts.append(pack_bits(flat['flags']))
+
+    header = HEADER.pack(MAGIC, VERSION, STATES.index(flat['state']),
+                         len(dimensions), flags)
+    sizes = struct.pack(f'<{len(dimensions) + 1}Q', *dimensions, flat['hidden_safe'])
+
+    return b''.join([header, sizes] + parts)
+
+
+def decode_game(data, flat=False):
+    """
+    Decodes a game encoded by encode_game.
+
+    Args:
+       data (bytes): Encoded game
+       flat (bool): Whether to return a flat game instead of nested lists
+
+    Returns:
+       A game state dictionary
+
+    >>> from minesweeper import new_game_nd, dig_nd
+    >>> g = new_game_nd((2, 4, 2), [(0, 0, 1), (1, 0, 0), (1, 1, 1)])
+    >>> dig_nd(g, (0, 3, 0))
+    8
+    >>> data = encode_game(g)
+    >>> len(data), decode_game(data) == g
+    (58, True)
+
+    Flags (and their neighbor counts) are kept:
+
+    >>> from minesweeper import flag_nd
+    >>> flag_nd(g, (1, 0, 0))
+    True
+    >>> g2 = decode_game(encode_game(g))
+    >>> g2 == g, dig_nd(g2, (1, 0, 0)), g2['state']
+    (True, 0, 'ongoing')
+    """
+
+    magic, version, state, ndim, flags = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('not a saved game')
+    if version not in VERSIONS:
+        raise ValueError(f'unsupported saved game version: {version}')
+    if flags & MAPPED:
+        raise ValueError('memory-mapped games are opened with open_mapped_game')
+
+    position = HEADER.size
+    *dimensions, hidden_safe = struct.unpack_from(f'<{ndim + 1}Q', data, position)
+    position += 8 * (ndim + 1)
+    dimensions = list(dimensions) if flags & DIMENSIONS_ARE_LIST else tuple(dimensions)
+
+    size = board_size(dimensions)
+    board = decode_board(data[position:position + size], dimensions)
+    position += size
+    bits = (len(board) + 7) // 8
+    mask = unpack_bits(data[position:position + bits], len(board))
+
+    game = {
+        'dimensions': dimensions,
+        'strides': get_strides(dimensions),
+        'board': board,
+        'mask': mask,
+        'hidden_safe': hidden_safe,
+        'state': STATES[state]}
+    if flags & FLAGGED:
+        for offset, flagged in enumerate(unpack_bits(data[position + bits:], len(board))):
+            if flagged:
+                set_flag(game, offset, True)
+    return game if flat else unflatten_game(game)
+
+
+def save_game(game, fp):
+    """
+    Writes a game to a binary file object.
+
+    Args:
+       game (dict): Game state
+       fp: binary file object
+
+    Returns:
+       nothing
+    """
+
+    fp.write(encode_game(game))
+
+
+def load_game(fp, flat=False):
+    """
+    Reads a game written by save_game from a binary file object.
+
+    Args:
+       fp: binary file object
+       flat (bool): Whether to return a flat game instead of nested lists
+
+    Returns:
+       A game state dictionary
+    """
+
+    return decode_game(fp.read(), flat)
+
+
+def create_mapped_game(path, dimensions, bombs):
+    """
+    Creates a new game in a memory-mapped file and opens it.  The board is
+    built directly in the file, without an in-memory copy.
+
+    Args:
+       path (str): File to create
+       dimensions (tuple): Dimensions of the board
+       bombs (list): Bomb locations, each an N-dimensional coordinate
+
+    Returns:
+       A flat game state dictionary backed by the file (see open_mapped_game)
+
+    >>> import os, tempfile
+    >>> from minesweeper import dig_nd, render_nd
+    >>> path = os.path.join(tempfile.mkdtemp(), 'game.msw')
+    >>> g = create_mapped_game(path, (2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_nd(g, (0, 3))
+    4
+    >>> close_mapped_game(g)
+    >>> g = open_mapped_game(path)
+    >>> render_nd(g), g['hidden_safe']
+    ([['_', '_', '1', ' '], ['_', '_', '1', ' ']], 1)
+    >>> close_mapped_game(g)
+    """
+
+    dimensions = tuple(dimensions)
+    strides = get_strides(dimensions)
+    offsets = {cell_to_offset(strides, b) for b in bombs}
+    cells = prod(dimensions)
+    flags = MAPPED | (BIG_ENDIAN if sys.byteorder == 'big' else 0)
+
+    header = HEADER.pack(MAGIC, VERSION, STATES.index('ongoing'), len(dimensions), flags)
+    sizes = struct.pack(f'<{len(dimensions) + 1}Q', *dimensions, cells - len(offsets))
+    itemsize = array(board_typecode(dimensions)).itemsize
+
+    # The file starts out all zeros: no neighbors, nothing revealed
+    with open(path, 'wb') as fp:
+        fp.write(header + sizes)
+        fp.truncate(len(header) + len(sizes) + cells * (itemsize + 1))
+
+    game = open_mapped_game(path)
+    board = game['board']
+    for b in offsets:
+        for n in neighbor_offsets(dimensions, b):
+            board[n] += 1
+    for b in offsets:
+        board[b] = BOMB
+
+    return game
+
+
+class MappedGame(dict):
+    """
+    Game state dictionary of a memory-mapped game, which writes its 'state'
+    and 'hidden_safe' through to the header of the mapped file.
+    """
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if key == 'state':
+            self['mmap'][5] = STATES.index(value)
+        elif key == 'hidden_safe':
+            position = HEADER.size + 8 * len(self['dimensions'])
+            struct.pack_into('<Q', self['mmap'], position, value)
+
+
+def open_mapped_game(path):
+    """
+    Opens a game created by create_mapped_game.  Nothing but the header is
+    read: 'board' and 'mask' are views of the mapped file, so pages are
+    loaded as digs and renders touch them.
+
+    Args:
+       path (str): File of the game
+
+    Returns:
+       A flat game state dictionary (a MappedGame), with the mapping in 'mmap'
+
+    >>> import os, tempfile
+    >>> from minesweeper import dig_nd
+    >>> path = os.path.join(tempfile.mkdtemp(), 'game.msw')
+    >>> g = create_mapped_game(path, (2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_nd(g, (0, 3)), dig_nd(g, (0, 1))
+    (4, 1)
+    >>> copy = open_mapped_game(path)
+    >>> copy['hidden_safe'], copy['state']
+    (0, 'victory')
+    >>> close_mapped_game(copy)
+    >>> close_mapped_game(g)
+    """
+
+    with open(path, 'r+b') as fp:
+        mapping = mmap.mmap(fp.fileno(), 0)
+
+    magic, version, state, ndim, flags = HEADER.unpack_from(mapping)
+    if magic != MAGIC or not flags & MAPPED:
+        raise ValueError('not a memory-mapped game')
+    if version not in VERSIONS:
+        raise ValueError(f'unsupported saved game version: {version}')
+    if bool(flags & BIG_ENDIAN) != (sys.byteorder == 'big'):
+        raise ValueError('memory-mapped game was created with another byte order')
+
+    *dimensions, hidden_safe = struct.unpack_from(f'<{ndim + 1}Q', mapping, HEADER.size)
+    dimensions = tuple(dimensions)
+    typecode = board_typecode(dimensions)
+    cells = prod(dimensions)
+
+    start = HEADER.size + 8 * (ndim + 1)
+    middle = start + cells * array(typecode).itemsize
+    view = memoryview(mapping)
+
+    return MappedGame({
+        'dimensions': dimensions,
+        'strides': get_strides(dimensions),
+        'board': view[start:middle].cast(typecode),
+        'mask': view[middle:middle + cells],
+        'hidden_safe': hidden_safe,
+        'state': STATES[state],
+        'mmap': mapping})
+
+
+def sync_mapped_game(game):
+    """
+    Writes the state and hidden safe count of a memory-mapped game to its
+    header (digs already keep them there) and flushes the mapping to disk.
+
+    Args:
+       game (dict): Game state returned by open_mapped_game
+
+    Returns:
+       nothing
+    """
+
+    mapping = game['mmap']
+    ndim = len(game['dimensions'])
+    mapping[5] = STATES.index(game['state'])
+    struct.pack_into('<Q', mapping, HEADER.size + 8 * ndim, game['hidden_safe'])
+    mapping.flush()
+
+
+def close_mapped_game(game):
+    """
+    Syncs a memory-mapped game and closes its mapping.
+
+    Args:
+       game (dict): Game state returned by open_mapped_game
+
+    Returns:
+       nothing
+    """
+
+    sync_mapped_game(game)
+    game['board'].release()
+    game['mask'].release()
+    game['mmap'].close()